@@ -0,0 +1,266 @@
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from agno.utils.log import logger
+
+from tracing import get_tracer
+
+# Lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+# Requests per minute per model; anything unlisted gets DEFAULT_RPM
+RATE_LIMITS = {
+    "gemini-2.0-flash-exp": int(os.getenv("GEMINI_RPM", "10")),
+    "models/text-embedding-004": int(os.getenv("EMBEDDING_RPM", "1500")),
+}
+DEFAULT_RPM = int(os.getenv("DEFAULT_RPM", "60"))
+# Provider calls in flight across all sessions and the ingestion worker
+MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "8"))
+# Slots background work can never take, so a query always finds one free
+INTERACTIVE_RESERVED = int(os.getenv("PROVIDER_INTERACTIVE_RESERVED", "2"))
+MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# An interactive call queued longer than this gives up with SchedulerBusy
+MAX_WAIT = float(os.getenv("PROVIDER_MAX_WAIT", "120"))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_priority = contextvars.ContextVar("call_priority", default=INTERACTIVE)
+
+
+class SchedulerBusy(Exception):
+    """Raised when a provider call could not be admitted or kept failing with 429/5xx."""
+
+
+# Priority of provider calls made from the current context, and from threads it starts
+# through tracing.in_current_context
+def set_priority(level):
+    _priority.set(level)
+
+
+# HTTP status of a google-genai error, also when wrapped in agno's ModelProviderError
+def error_status(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if isinstance(status, int):
+            return status
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_retryable(error):
+    return error_status(error) in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        # A full minute's quota may burst, matching the provider's per-minute window
+        self.capacity = capacity or max(1, rate_per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until a token is available; 0 when one is available now
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    # After a 429 the provider's window is exhausted whatever our estimate says
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+# Process-wide admission control for Gemini model and embedding calls: per-model token
+# buckets, a bounded number of calls in flight, interactive-before-background ordering,
+# and jittered exponential backoff on 429/5xx.
+class CallScheduler:
+    def __init__(
+        self,
+        rate_limits=None,
+        default_rpm=DEFAULT_RPM,
+        max_concurrency=MAX_CONCURRENCY,
+        interactive_reserved=INTERACTIVE_RESERVED,
+        max_retries=MAX_RETRIES,
+        max_wait=MAX_WAIT,
+    ):
+        self.rate_limits = dict(RATE_LIMITS if rate_limits is None else rate_limits)
+        self.default_rpm = default_rpm
+        self.max_concurrency = max_concurrency
+        self.interactive_reserved = min(interactive_reserved, max_concurrency - 1)
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self.admitted = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def _bucket(self, model):
+        if model not in self._buckets:
+            self._buckets[model] = TokenBucket(self.rate_limits.get(model, self.default_rpm))
+        return self._buckets[model]
+
+    # Caller holds the condition. The head of each model's queue may go when its bucket has a
+    # token and a slot is free, unless a higher-priority call that could run is still waiting.
+    def _can_admit(self, entry):
+        level, sequence, model = entry
+        limit = self.max_concurrency - (self.interactive_reserved if level > INTERACTIVE else 0)
+        if self._in_flight >= limit or self._bucket(model).wait_time() > 0:
+            return False
+        for other_level, other_sequence, other_model in self._waiting:
+            if (other_level, other_sequence) >= (level, sequence):
+                continue
+            if other_model == model or (other_level < level and self._bucket(other_model).wait_time() == 0):
+                return False
+        return True
+
+    def _acquire(self, model, level):
+        entry = (level, next(self._sequence), model)
+        start = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+            try:
+                while not self._can_admit(entry):
+                    waited = time.monotonic() - start
+                    if level == INTERACTIVE and waited >= self.max_wait:
+                        self.rejected += 1
+                        raise SchedulerBusy(f"{model} is saturated, waited {waited:.0f} s")
+                    timeout = self._bucket(model).wait_time() or 0.5
+                    self._condition.wait(min(timeout, 0.5))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            self._bucket(model).take()
+            self._in_flight += 1
+            self.admitted += 1
+            self.wait_seconds += time.monotonic() - start
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _throttled(self, model, error, attempt):
+        with self._condition:
+            self.retries += 1
+            if error_status(error) == 429:
+                self.throttled += 1
+                self._bucket(model).drain()
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+        # Full jitter keeps sessions that were throttled together from retrying together
+        delay = random.uniform(0, delay)
+        logger.warning(f"{model} call failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.1f} s")
+        time.sleep(delay)
+
+    @contextmanager
+    def slot(self, model):
+        level = _priority.get()
+        with get_tracer().span("admission.wait", model=model, priority=level):
+            self._acquire(model, level)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def call(self, model, fn, /, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(model):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt == self.max_retries:
+                    raise SchedulerBusy(f"{model} still failing after {self.max_retries} retries: {e}") from e
+                self._throttled(model, e, attempt)
+
+    # Like call() for a generator; only retried while nothing has been yielded yet
+    def stream(self, model, fn, /, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self.slot(model):
+                    for item in fn(*args, **kwargs):
+                        started = True
+                        yield item
+                return
+            except Exception as e:
+                if started or not is_retryable(e):
+                    raise
+                if attempt == self.max_retries:
+                    raise SchedulerBusy(f"{model} still failing after {self.max_retries} retries: {e}") from e
+                self._throttled(model, e, attempt)
+
+    def stats(self):
+        with self._condition:
+            waiting = [entry[0] for entry in self._waiting]
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(waiting),
+                "queued_interactive": sum(1 for level in waiting if level <= INTERACTIVE),
+                "queued_background": sum(1 for level in waiting if level > INTERACTIVE),
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "avg_wait_seconds": round(self.wait_seconds / self.admitted, 3) if self.admitted else 0.0,
+            }
+
+    def prometheus_lines(self):
+        stats = self.stats()
+        lines = []
+        for name, kind in [
+            ("in_flight", "gauge"),
+            ("queued_interactive", "gauge"),
+            ("queued_background", "gauge"),
+            ("admitted", "counter"),
+            ("retries", "counter"),
+            ("throttled", "counter"),
+            ("rejected", "counter"),
+        ]:
+            metric = f"budget_provider_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+        return lines
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CallScheduler()
+            for exporter in get_tracer().exporters:
+                if hasattr(exporter, "add_collector"):
+                    exporter.add_collector(_scheduler.prometheus_lines)
+        return _scheduler
@@ -0,0 +1,331 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from textwrap import dedent
+from uuid import uuid4
+
+from agno.agent import Agent
+from agno.models.google import Gemini
+from agno.run.response import RunEvent
+from agno.tools.duckduckgo import DuckDuckGoTools
+from google import genai
+
+from admission import get_scheduler
+from context_assembly import ContextAssembler
+from tables import query_budget_table
+from tracing import get_tracer
+from web_cache import CachedDuckDuckGoTools
+
+MODEL_ID = "gemini-2.0-flash-exp"
+# Upper bound on teams built per process, i.e. on budget_agent runs executing at once
+POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+# Seconds a run waits for a free team once all pool_size teams are busy
+POOL_WAIT = float(os.getenv("AGENT_POOL_WAIT", "60"))
+
+
+class RegistryBusy(Exception):
+    """Raised when every agent team stayed busy for longer than the registry's pool_wait."""
+
+
+# Gemini with a span per model request (with token counts) and per tool call, including
+# delegations to team members and the searcher's DuckDuckGo calls. Every request goes
+# through the shared admission scheduler (rate limits, priority, retries on 429/5xx).
+class TracedGemini(Gemini):
+    def _record_usage(self, span, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            span.set(input_tokens=usage.prompt_token_count or 0, output_tokens=usage.candidates_token_count or 0)
+
+    def invoke(self, messages):
+        with get_tracer().span("model.generate", model=self.id) as span:
+            response = get_scheduler().call(self.id, super().invoke, messages)
+            self._record_usage(span, response)
+            return response
+
+    def invoke_stream(self, messages):
+        with get_tracer().span("model.generate", model=self.id, stream=True) as span:
+            for chunk in get_scheduler().stream(self.id, super().invoke_stream, messages):
+                self._record_usage(span, chunk)
+                yield chunk
+
+    def run_function_calls(self, function_calls, function_call_results):
+        for function_call in function_calls:
+            with get_tracer().span(f"tool_call.{function_call.function.name}"):
+                yield from super().run_function_calls([function_call], function_call_results)
+            if self.tool_choice == "none":
+                # tool_call_limit was reached
+                break
+
+
+# Builds one knowledge_agent + searcher + budget_agent team
+def build_budget_team(model_factory, knowledge, web_tools, web_cache=None):
+    knowledge_agent = Agent(
+        # Delegation shows up as transfer_task_to_knowledge_agent, matching the instructions below
+        name="Knowledge Agent",
+        model=model_factory(),
+        knowledge=knowledge,
+        search_knowledge=True,
+        # Diverse, deduplicated chunks within CONTEXT_TOKEN_BUDGET instead of the raw top-k,
+        # drawn from the knowledge base and pages cached from earlier web searches
+        retriever=ContextAssembler(web_cache=web_cache),
+        description="📖 Expert on Indian Budget Documents & Websites",
+        instructions=[
+            "When answering user questions, first delegate the query to the knowledge base and prioritize checking local PDF documents (e.g.Union Budget FY25-26.pdf) for accurate information.",
+            "If the answer is not found in the local PDFs, then check other sources in the knowledge base (e.g., PDF URLs and websites).",
+            "If the answer is not found in the knowledge base, automatically use DuckDuckGoTools for further web research.",
+            "Present your response in a formal manner with headings like 'Overview', 'Details', 'Conclusion', 'Visualization','Sources & Methodology', 'additional information' etc.",
+            "For complex queries, break them down into simpler parts if necessary.",
+            "Ensure responses are accurate and reference the document or website explicitly where possible.",
+            "Use markdown for formatting responses, including bullet points and tables where appropriate.",
+            "If the query seems ambiguous, ask for clarification from the user."
+        ]
+    )
+
+    searcher = Agent(
+        name="Searcher",
+        model=model_factory(),
+        role="🔎 Web Searcher for Budget Analysis",
+        description="Specialist in retrieving and analyzing Indian Budget information.",
+        instructions=[
+            "Activate only when explicitly delegated a query by the 'budget_agent' after the 'knowledge_agent' fails to provide a sufficient answer from the knowledge base.",
+            "First, check if the user answer can be found in the existing knowledge_agent or knowledge base.",
+            "Reputable financial news outlets (e.g., Moneycontrol, Economic Times)",
+            "Economic think tanks and analyses (e.g., NITI Aayog, IMF).",
+            "If the information is not available in the knowledge_agent or knowledge base, automatically initiate a web search using DuckDuckGoTools.",
+            "Prioritize Indian financial news, government websites, and international news discussing India's budget.",
+            "Search specifically for documents or articles related to the Indian Union Budget, focusing on official sources from the government, reputable financial news, and analysis platforms.",
+            "When searching, use keywords like 'Indian Budget Analysis', 'Union Budget India', 'Budget 2025-2026 India', along with any specific terms from the query to refine the search.",
+            "Compile the results, summarizing key points in your response.",
+            "Focus on time-sensitive information related to budget announcements and their immediate global impact.",
+            "Maintain objectivity with a focus on data from economic think tanks and financial analysts.",
+            "Ensure that the response includes an 'Overview', 'Details' section for in-depth information, and a 'Conclusion' or 'Summary'.",
+            "Use markdown for formatting responses, incorporating bullet points for clarity and tables where data comparison is needed.",
+            "If the query is ambiguous or requires further clarification, ask for more details from the user.",
+            "Keep responses formal and precise, always citing or referencing the source of information when possible.",
+            "Use bullet points for clarity."
+            "**📈 Data Visualization** (if applicable)"
+            "**Table**: For numerical comparisons, e.g."
+        ],
+        tools=[web_tools],
+        show_tool_calls=True,
+        search_knowledge=True,
+    )
+
+    budget_agent = Agent(
+        name="Budget Analysis Agent",
+        model=model_factory(),
+        team=[knowledge_agent, searcher],
+        tools=[query_budget_table],
+        description=dedent("""\
+            🤖 An expert analyst team dedicated to analyzing and providing insights on the Indian Budget. 
+            This agent leverages pre-existing knowledge from official documents from the knowledge base or current web-based information to deliver comprehensive budget analysis. 
+            It works in tandem with a knowledge agent for document-based queries and a searcher agent for the latest updates and analyses from the web.
+            If no data found in the Knowledge agent Automatically run the searcher agent.
+        """),
+        instructions=dedent("""\
+            - For allocation, expenditure or receipt figures of a ministry, demand or scheme, first call 'query_budget_table' and use its numbers (₹ crore) in the Numerical Breakdown.
+            - Start by delegating the user’s query to the 'knowledge_agent' to search the existing knowledge base, which contains official budget documents and trusted website data.
+            - Wait for the 'knowledge_agent' to provide a response before taking any further action.
+            - Begin by delegating the query to the 'knowledge_agent' to check for any relevant information in the existing knowledge bases.
+            - Do not run the 'searcher' agent unless the 'knowledge_agent' explicitly fails to provide a sufficient answer, as defined above.
+            - If the 'knowledge_agent' does not respond or no answer, automatically delegate the task to the 'searcher' agent to perform a web search.
+            - For both agents, ensure searches are tailored with keywords like 'Indian Budget', 'Union Budget India', 'Budget Analysis', and any query-specific terms.
+            - Key viewpoints from budget speeches, financial reviews, and economic think tanks.
+            - If the response from knowledge_agent is empty or inadequate, **run the searcher**.
+            - Stakeholder reactions: Include responses from industry bodies/opposition.
+            - Format the response with clear headings:
+              - **📌 Overview**: A brief summary of the budget point in question.
+              - **📊 Details**: In-depth analysis, including any numerical data, policy implications, or sector-specific impacts.
+              - **✅ Conclusion**: Summarize key takeaways, expected outcomes, or areas for further research.
+              -- **Numerical Data**: Tables or figures for budgetary allocations and expenditures.
+              -- **Sources**: Cite documents or URLs where applicable.
+            - Comparisons with previous budgets for trend analysis.
+            - Use markdown for formatting outputs, including bullet points, tables, or code blocks for clarity.
+            - If the query lacks clarity, prompt the user for additional details or clarification.
+            - Maintain a formal and professional tone in responses, always citing sources where applicable.
+            - Use bullet points for clarity.
+        
+        """),
+        expected_output=dedent("""\
+            # {Compelling Headline}                   
+            ### Overview
+            - Here's a brief summary of the budget analysis for the query.
+            ### Details
+            - Detailed breakdown including numbers, policies, and sector analysis.
+            ## Expert Insights
+            - Quotes from economists and market analysts
+            ## Numerical Breakdown
+            - Create comparative tables for allocations:
+                | Sector | 2024-25 | 2025-26 | Change (%) |
+                |--------|---------|---------|------------|
+                | Health | 89,000cr| 1,05,000cr | +18%     |
+            ## Geographic Distribution
+            - State-wise fund allocation patterns
+            - Special focus regions/aspirational districts
+            Always include:
+            - Reference to specific document/page numbers
+            - Source URLs for web-sourced information
+            - Last updated timestamps for time-sensitive data                           
+            ## Sources & Methodology
+            - Description of research process and sources
+            - page number of pdfs and source page name and file name
+            - website urls list 
+            ## For technical queries:
+            - Create flowchart for complex processes
+            - Use code blocks for formula explanations
+            - Add footnotes for legal citations        
+                                                                                                    
+            ### Conclusion
+            - Key insights and implications from the budget analysis.
+            - Suggested compliance strategies.
+                           
+            ### Visualization
+            - "**📈 Data Visualization** (if applicable):"
+            - "**Table**: For numerical comparisons, "
+            - Include tables/pie charts when data is sufficient (3+ points) and relevant.
+            ---
+            Research conducted by Financial Agent
+            Credit Rating Style Report
+            Published: {current_date}
+            Last Updated: {current_time}                                                    
+        """),
+        add_datetime_to_instructions=True,
+        markdown=True,
+        show_tool_calls=True,
+    )
+
+    return budget_agent
+
+
+# Process-wide home for the agent team. Teams are built lazily up to pool_size and
+# handed out one run at a time, so concurrent sessions never share conversation state,
+# while every team reuses the same Gemini HTTP client and DuckDuckGo toolkit.
+class AgentRegistry:
+    def __init__(
+        self,
+        api_key,
+        knowledge=None,
+        pool_size=POOL_SIZE,
+        model_id=MODEL_ID,
+        client=None,
+        web_cache=None,
+        pool_wait=POOL_WAIT,
+    ):
+        self.client = client or genai.Client(api_key=api_key)
+        self.web_cache = web_cache
+        self.web_tools = CachedDuckDuckGoTools(web_cache) if web_cache is not None else DuckDuckGoTools()
+        self.api_key = api_key
+        self.model_id = model_id
+        self.knowledge = knowledge
+        self.pool_size = pool_size
+        self.pool_wait = pool_wait
+        self._pool = queue.Queue()
+        self._lock = threading.Lock()
+        self.teams_built = 0
+        self.construction_seconds = 0.0
+        self.runs = 0
+        self.run_seconds = 0.0
+        self.last_run_seconds = None
+        self.last_first_token_seconds = None
+
+    def new_model(self):
+        return TracedGemini(id=self.model_id, api_key=self.api_key, client=self.client)
+
+    def set_knowledge(self, knowledge):
+        self.knowledge = knowledge
+
+    def _build(self):
+        start = time.perf_counter()
+        team = build_budget_team(self.new_model, self.knowledge, self.web_tools, self.web_cache)
+        with self._lock:
+            self.construction_seconds += time.perf_counter() - start
+        return team
+
+    @contextmanager
+    def checkout(self):
+        try:
+            team = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_build = self.teams_built < self.pool_size
+                if can_build:
+                    self.teams_built += 1
+            if can_build:
+                try:
+                    team = self._build()
+                except Exception:
+                    # Give the slot back, or every failed build would shrink the pool for good
+                    with self._lock:
+                        self.teams_built -= 1
+                    raise
+            else:
+                try:
+                    team = self._pool.get(timeout=self.pool_wait)
+                except queue.Empty:
+                    raise RegistryBusy(f"All {self.pool_size} agent teams busy for {self.pool_wait:g} s")
+        # Start every run from a clean session, pointed at the current knowledge base
+        for agent in [team] + team.team:
+            agent.session_id = str(uuid4())
+            if agent.memory is not None:
+                agent.memory.clear()
+            if agent.knowledge is not None:
+                agent.knowledge = self.knowledge
+        try:
+            yield team
+        finally:
+            self._pool.put(team)
+
+    def run(self, message, **kwargs):
+        with self.checkout() as team, get_tracer().span("agent.run", agent=team.name):
+            start = time.perf_counter()
+            response = team.run(message, **kwargs)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.runs += 1
+            self.run_seconds += elapsed
+            self.last_run_seconds = elapsed
+        return response
+
+    # Same as run(), but yields RunResponse chunks (content deltas and tool-call events) as they arrive
+    def run_stream(self, message, **kwargs):
+        with self.checkout() as team, get_tracer().span("agent.run", agent=team.name, stream=True) as span:
+            start = time.perf_counter()
+            first_token = None
+            for chunk in team.run(message, stream=True, stream_intermediate_steps=True, **kwargs):
+                if first_token is None and chunk.event == RunEvent.run_response.value and chunk.content:
+                    first_token = time.perf_counter() - start
+                yield chunk
+            elapsed = time.perf_counter() - start
+            span.set(first_token_seconds=first_token)
+        with self._lock:
+            self.runs += 1
+            self.run_seconds += elapsed
+            self.last_run_seconds = elapsed
+            self.last_first_token_seconds = first_token
+
+    def stats(self):
+        with self._lock:
+            return {
+                "teams_built": self.teams_built,
+                "construction_seconds": round(self.construction_seconds, 3),
+                "runs": self.runs,
+                "avg_run_seconds": round(self.run_seconds / self.runs, 2) if self.runs else None,
+                "last_run_seconds": round(self.last_run_seconds, 2) if self.last_run_seconds else None,
+                "last_first_token_seconds": (
+                    round(self.last_first_token_seconds, 2) if self.last_first_token_seconds else None
+                ),
+            }
+
+
+# Short progress label for a tool call event, e.g. delegation to a team member
+def describe_tool_call(tool):
+    name = tool.get("tool_name") or tool.get("function", {}).get("name", "")
+    if name.startswith("transfer_task_to_"):
+        return f"🤝 Delegating to {name[len('transfer_task_to_'):]}"
+    if name == "search_knowledge_base":
+        return "📚 Searching the knowledge base"
+    if name.startswith("duckduckgo"):
+        return "🌍 Searching the web"
+    return f"🛠️ Calling {name}"
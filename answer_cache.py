@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from agno.utils.log import logger
+
+CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "tmp/answer_cache.sqlite")
+# Cosine similarity above which two queries are treated as the same question
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 86400)))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+
+def normalize_query(query):
+    query = re.sub(r"[^\w\s₹%.-]", " ", query.lower())
+    return re.sub(r"\s+", " ", query).strip(" .")
+
+
+# Years, demand numbers and amounts: queries differing in any of these want different answers
+def numeric_tokens(normalized):
+    return {token.strip(".") for token in normalized.split() if any(char.isdigit() for char in token)}
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        embedder=None,
+        path=CACHE_PATH,
+        threshold=SIMILARITY_THRESHOLD,
+        ttl=TTL_SECONDS,
+        max_entries=MAX_ENTRIES,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                embedding BLOB,
+                content TEXT NOT NULL,
+                kb_version INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                charts TEXT
+            )"""
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(answers)")}
+        if "charts" not in columns:
+            self._db.execute("ALTER TABLE answers ADD COLUMN charts TEXT")
+        self._db.commit()
+
+    def _embed(self, normalized):
+        if self.embedder is None:
+            return None
+        try:
+            embedding = self.embedder.get_embedding(normalized)
+        except Exception as e:
+            logger.warning(f"Answer cache could not embed query: {e}")
+            return None
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _evict(self, kb_version):
+        # Answers built on an older knowledge base, expired answers, then least recently used
+        self._db.execute(
+            "DELETE FROM answers WHERE kb_version != ? OR created_at < ?",
+            (kb_version, time.time() - self.ttl),
+        )
+        self._db.execute(
+            "DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    # Returns (answer, chart queries) for query, or None; embeds the query only on an exact-match miss
+    def get(self, query, kb_version):
+        normalized = normalize_query(query)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._evict(kb_version)
+            self._db.commit()
+            row = self._db.execute("SELECT key, content, charts FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            vector = self._embed(normalized)
+            if vector is not None:
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT key, content, charts, embedding, query FROM answers WHERE length(embedding) = ?",
+                        (vector.nbytes,),
+                    ).fetchall()
+                # A paraphrase may only reuse an answer about exactly the same figures
+                numbers = numeric_tokens(normalized)
+                rows = [row for row in rows if numeric_tokens(normalize_query(row[4])) == numbers]
+                if rows:
+                    matrix = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+                    scores = matrix @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        row = rows[best][:3]
+                        self.semantic_hits += 1
+        if row is None:
+            self.misses += 1
+            return None
+        with self._lock:
+            self._db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), row[0]))
+            self._db.commit()
+        self.hits += 1
+        return row[1], json.loads(row[2]) if row[2] else []
+
+    def put(self, query, content, kb_version, charts=None):
+        if not content:
+            return
+        normalized = normalize_query(query)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        vector = self._embed(normalized)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, query, embedding, content, kb_version, created_at, last_used, charts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    query,
+                    vector.tobytes() if vector is not None else None,
+                    content,
+                    kb_version,
+                    now,
+                    now,
+                    json.dumps(charts) if charts else None,
+                ),
+            )
+            self._evict(kb_version)
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses, "entries": entries}
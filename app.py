@@ -1,22 +1,18 @@
 import streamlit as st
 from dotenv import load_dotenv
-from pathlib import Path
 import os
 import time
-import requests  # For synchronous HTTP requests
-from agno.agent import Agent
-from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.vectordb.lancedb import LanceDb
 from agno.embedder.google import GeminiEmbedder
-from agno.knowledge.pdf_url import PDFUrlKnowledgeBase
-from agno.knowledge.website import WebsiteKnowledgeBase
-from agno.knowledge.combined import CombinedKnowledgeBase
-from agno.knowledge.pdf import PDFKnowledgeBase
-from agno.models.google import Gemini
-from textwrap import dedent
-from agno.vectordb.search import SearchType
+from agno.run.response import RunEvent
 import plotly.express as px
-import re
+from embedding_cache import CachedEmbedder
+from answer_cache import AnswerCache
+from worker import IngestionWorker
+from tables import get_table_store
+from agents import AgentRegistry, RegistryBusy, describe_tool_call
+from tracing import get_tracer, trace_breakdown
+from admission import SchedulerBusy, get_scheduler
+from web_cache import WebCache
 
 # Load environment variables
 load_dotenv()
@@ -25,7 +21,10 @@ if not api_key:
     st.error("⚠️ API Key not found. Please set GEMINI_API_KEY in .env or Streamlit secrets.")
     st.stop()
 
-embedder = GeminiEmbedder(id="models/text-embedding-004", dimensions=768, api_key=api_key)
+# Embeddings are cached on disk, so overlapping documents and repeated queries skip the API
+embedder = CachedEmbedder(
+    embedder=GeminiEmbedder(id="models/text-embedding-004", dimensions=768, api_key=api_key)
+)
 
 # Custom CSS for gradient background
 page_bg_css = """
@@ -72,287 +71,46 @@ st.markdown(page_bg_css, unsafe_allow_html=True)
 st.title("💡 Indian Budget Analysis AI Agent")
 st.markdown("🚀 Ask me anything about the **Indian Union Budget 2025-26**")
 
-# Synchronous function to fetch URLs
-def fetch_url(url):
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return url, response.content
-        else:
-            st.warning(f"⚠️ Failed to fetch {url}: Status {response.status_code}")
-            return url, None
-    except Exception as e:
-        st.warning(f"⚠️ Error fetching {url}: {str(e)}")
-        return url, None
+# Web search results and the pages behind them, reused by every session until they expire
+@st.cache_resource
+def get_web_cache():
+    return WebCache(embedder)
 
-# Function to initialize knowledge bases synchronously
-@st.cache_resource(ttl=86400)  # Cache for 24 hours
-def initialize_knowledge_bases():
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+web_cache = get_web_cache()
 
-    status_text.text("🔄 Initializing Vector DB...")
-    time.sleep(1)  # Simulate DB setup
-    vector_db = LanceDb(
-        table_name="budget",
-        uri="tmp/lancedb",
-        search_type=SearchType.vector,
-        embedder=embedder,
-    )
-    progress_bar.progress(30)
-    time.sleep(1)
+# Agents are built once per process and shared by every session; see agents.py
+@st.cache_resource
+def get_agent_registry():
+    return AgentRegistry(api_key=api_key, web_cache=web_cache)
 
-    status_text.text("📄 Loading Budget Local PDF Documents...")
-    time.sleep(1)
-    pdf_folder = Path(".")
-    pdf_files = [
-        pdf_folder / "Union_Budget_FY25-26.pdf"          
-    ]
-    combined_pdf_kb = []
-    for pdf_file in pdf_files:
-        pdf_kb = PDFKnowledgeBase(
-            path=pdf_file,
-            vector_db=LanceDb(
-                table_name=f"pdf_{pdf_file.stem}",
-                uri="tmp/lancedb",
-                search_type=SearchType.vector,
-                embedder=embedder,
-            ),
-            name=f"Indian Budget Local PDF - {pdf_file.stem}",
-            instructions=[
-                "Prioritize checking the pdf for answers.",
-                "Chunk the pdf in a way that preserves context.",
-                "Ensure important sections like summaries and conclusions remain intact.",
-                "Maintain the integrity of the logical sections if needed.",
-                "Each chunk should provide enough information to answer questions independently.",
-                "Create self-contained information units that can provide a full answer to a query.",
-            ]
-        )
-        combined_pdf_kb.append(pdf_kb)
+agent_registry = get_agent_registry()
 
-    status_text.text("📄 Loading Budget PDF Documents...")
-    pdf_urls = [
-        "https://www.indiabudget.gov.in/doc/rec/allrec.pdf",
-        "https://prsindia.org/files/budget/budget_parliament/2025/Union_Budget_Analysis_2025-26.pdf",
-        "https://www.ey.com/content/dam/ey-unified-site/ey-com/en-in/technical/alerts-hub/documents/2025/ey-union-budget-2025-alert-infra-sector.pdf",
-        "https://www.indiabudget.gov.in/doc/bh1.pdf",
-        "https://static.pib.gov.in/WriteReadData/specificdocs/documents/2025/feb/doc202524496501.pdf",
-        "https://www.indiabudget.gov.in/doc/AFS/allafs.pdf",
-        "https://www.indiabudget.gov.in/doc/eb/alldg.pdf",
-        "https://www.indiabudget.gov.in/doc/eb/allsbe.pdf",
-        "https://www.indiabudget.gov.in/doc/Finance_Bill.pdf",
-        "https://www.indiabudget.gov.in/doc/Budget_Speech.pdf",
-        "https://www.indiabudget.gov.in/doc/OutcomeBudgetE2025_2026.pdf",
-        "https://www.indiabudget.gov.in/doc/memo.pdf",
-        "https://www.indiabudget.gov.in/doc/eb/vol1.pdf",
-        "https://www.indiabudget.gov.in/doc/frbm1.pdf",
-        "https://static.pib.gov.in/WriteReadData/specificdocs/documents/2025/feb/doc202521492801.pdf",
-        "https://www.indiabudget.gov.in/budget2024-25/doc/Key_to_Budget_Document_2024.pdf",
-    ]
+# Ingestion runs on a background thread (see worker.py); sessions only ever read the
+# last good snapshot, so nobody waits on fetching, parsing or embedding
+@st.cache_resource
+def get_ingestion_worker():
+    worker = IngestionWorker(embedder)
+    worker.start()
+    return worker
 
-    results = [fetch_url(url) for url in pdf_urls]
-    valid_urls = [url for url, content in results if content is not None]
-
-    pdf_knowledge_base = PDFUrlKnowledgeBase(
-        urls=valid_urls,
-        vector_db=vector_db,
-        name="Indian Budget Records",
-        instructions=[
-            "For user questions first check the pdf_knowledge_base.",
-            "Divide the document into chunks that maintain context around key concepts.",
-            "Ensure important sections like summaries and conclusions remain intact.",
-            "Each chunk should provide enough information to answer questions independently."
-        ]
-    )
-    progress_bar.progress(60)
+ingestion_worker = get_ingestion_worker()
+knowledge_base = ingestion_worker.current
+if knowledge_base is not None:
+    agent_registry.set_knowledge(knowledge_base)
+else:
+    job = ingestion_worker.status()
+    st.info(f"⏳ Building the knowledge base for the first time... {job['message']}")
+    st.progress(job["progress"])
 
-    status_text.text("🌍 Fetching Budget Website Data...")
-    website_urls = [
-        "https://www.india.gov.in/spotlight/union-budget-2025-2026",
-        "https://www.bajajfinserv.in/investments/income-tax-slabs",
-        "https://www.india.gov.in/spotlight/union-budget-2024-25",
-        "https://idronline.org/article/advocacy-government/budget-2025-understanding-social-sector-spending/?gad_source=1&gclid=CjwKCAiAlPu9BhAjEiwA5NDSA8hXbzwy3kj1HhhuaRlFZx4kgbgJsgDrPNIbigkD0WJQaocfzFZSwRoCnkYQAvD_BwE",
-        "https://frontline.thehindu.com/news/india-budget-2025-key-announcements-tax-relief-agriculture-healthcare-reforms/article69167699.ece",
-        "https://www.moneycontrol.com/budget/budget-2025-speech-highlights-key-announcements-of-nirmala-sitharaman-in-union-budget-of-india-article-12926372.html"
-    ]
+# Answer cache shared by all sessions and persisted across restarts
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(embedder=embedder)
 
-    website_results = [fetch_url(url) for url in website_urls]
-    valid_website_urls = [url for url, content in website_results if content is not None]
-
-    website_knowledge_base = WebsiteKnowledgeBase(
-        urls=valid_website_urls,
-        vector_db=LanceDb(
-            table_name="website_documents",
-            uri="tmp/lancedb",
-            search_type=SearchType.vector,
-            embedder=embedder,
-        ),
-        max_links=10,
-        name="Indian Budget Website",
-        instructions=[
-            "Focus on extracting information that directly answers user questions about the Indian Union Budget.",
-            "Prioritize sections like headlines, key findings, summaries, announcements, and data tables.",
-            "Identify and extract specific budget-related data, such as allocations, policy changes, tax reforms, or economic forecasts.",
-            "Ignore content that is not directly related to the Indian Union Budget, such as advertisements, site navigation, or unrelated news.",
-            "Ensure each extracted piece of information retains its original context and meaning, allowing it to be understood independently.",
-            "When extracting data, include any associated explanatory text or context that explains what the data means and where it comes from.",
-            "Maintain the logical flow and coherence of extracted content, avoiding fragmented or disconnected sentences.",
-            "If a section contains multiple related data points or insights, keep them together as a single coherent unit.",
-            "Extract exact information related to the user query."
-        ]
-    )
-    progress_bar.progress(80)
-
-    status_text.text("🔍 Combining Knowledge Bases...")
-    combined_knowledge_base = CombinedKnowledgeBase(
-        sources=[pdf_knowledge_base, website_knowledge_base] + combined_pdf_kb,
-        vector_db=LanceDb(
-            table_name="combined_documents",
-            uri="tmp/lancedb",
-            search_type=SearchType.vector,
-            embedder=embedder,
-        ),
-    )
-
-    time.sleep(1)  # Simulate loading
-    combined_knowledge_base.load(recreate=False)
-
-    progress_bar.progress(100)
-    status_text.text("✅ Knowledge Base Loaded Successfully!")
-    return combined_knowledge_base
-
-# Load knowledge base in session state
-if 'combined_knowledge_base' not in st.session_state:
-    st.session_state.combined_knowledge_base = initialize_knowledge_bases()
-
-# Initialize Agents (rest of the code remains the same)
-knowledge_agent = Agent(
-    model=Gemini(id="gemini-2.0-flash-exp", api_key=api_key),
-    knowledge=st.session_state.combined_knowledge_base,
-    search_knowledge=True,
-    description="📖 Expert on Indian Budget Documents & Websites",
-    instructions=[
-        "When answering user questions, first delegate the query to the knowledge base and prioritize checking local PDF documents (e.g.Union Budget FY25-26.pdf) for accurate information.",
-        "If the answer is not found in the local PDFs, then check other sources in the knowledge base (e.g., PDF URLs and websites).",
-        "If the answer is not found in the knowledge base, automatically use DuckDuckGoTools for further web research.",
-        "Present your response in a formal manner with headings like 'Overview', 'Details', 'Conclusion', 'Visualization','Sources & Methodology', 'additional information' etc.",
-        "For complex queries, break them down into simpler parts if necessary.",
-        "Ensure responses are accurate and reference the document or website explicitly where possible.",
-        "Use markdown for formatting responses, including bullet points and tables where appropriate.",
-        "If the query seems ambiguous, ask for clarification from the user."
-    ]
-)
-
-searcher = Agent(
-    name="Searcher",
-    model=Gemini(id="gemini-2.0-flash-exp", api_key=api_key),
-    role="🔎 Web Searcher for Budget Analysis",
-    description="Specialist in retrieving and analyzing Indian Budget information.",
-    instructions=[
-        "Activate only when explicitly delegated a query by the 'budget_agent' after the 'knowledge_agent' fails to provide a sufficient answer from the knowledge base.",
-        "First, check if the user answer can be found in the existing knowledge_agent or knowledge base.",
-        "Reputable financial news outlets (e.g., Moneycontrol, Economic Times)",
-        "Economic think tanks and analyses (e.g., NITI Aayog, IMF).",
-        "If the information is not available in the knowledge_agent or knowledge base, automatically initiate a web search using DuckDuckGoTools.",
-        "Prioritize Indian financial news, government websites, and international news discussing India's budget.",
-        "Search specifically for documents or articles related to the Indian Union Budget, focusing on official sources from the government, reputable financial news, and analysis platforms.",
-        "When searching, use keywords like 'Indian Budget Analysis', 'Union Budget India', 'Budget 2025-2026 India', along with any specific terms from the query to refine the search.",
-        "Compile the results, summarizing key points in your response.",
-        "Focus on time-sensitive information related to budget announcements and their immediate global impact.",
-        "Maintain objectivity with a focus on data from economic think tanks and financial analysts.",
-        "Ensure that the response includes an 'Overview', 'Details' section for in-depth information, and a 'Conclusion' or 'Summary'.",
-        "Use markdown for formatting responses, incorporating bullet points for clarity and tables where data comparison is needed.",
-        "If the query is ambiguous or requires further clarification, ask for more details from the user.",
-        "Keep responses formal and precise, always citing or referencing the source of information when possible.",
-        "Use bullet points for clarity."
-        "**📈 Data Visualization** (if applicable)"
-        "**Table**: For numerical comparisons, e.g."
-    ],
-    tools=[DuckDuckGoTools()],
-    show_tool_calls=True,
-    search_knowledge=True,
-)
-
-budget_agent = Agent(
-    name="Budget Analysis Agent",
-    model=Gemini(id="gemini-2.0-flash-exp", api_key=api_key),
-    team=[knowledge_agent, searcher],
-    description=dedent("""\
-        🤖 An expert analyst team dedicated to analyzing and providing insights on the Indian Budget. 
-        This agent leverages pre-existing knowledge from official documents from the knowledge base or current web-based information to deliver comprehensive budget analysis. 
-        It works in tandem with a knowledge agent for document-based queries and a searcher agent for the latest updates and analyses from the web.
-        If no data found in the Knowledge agent Automatically run the searcher agent.
-    """),
-    instructions=dedent("""\
-        - Start by delegating the user’s query to the 'knowledge_agent' to search the existing knowledge base, which contains official budget documents and trusted website data.
-        - Wait for the 'knowledge_agent' to provide a response before taking any further action.
-        - Begin by delegating the query to the 'knowledge_agent' to check for any relevant information in the existing knowledge bases.
-        - Do not run the 'searcher' agent unless the 'knowledge_agent' explicitly fails to provide a sufficient answer, as defined above.
-        - If the 'knowledge_agent' does not respond or no answer, automatically delegate the task to the 'searcher' agent to perform a web search.
-        - For both agents, ensure searches are tailored with keywords like 'Indian Budget', 'Union Budget India', 'Budget Analysis', and any query-specific terms.
-        - Key viewpoints from budget speeches, financial reviews, and economic think tanks.
-        - If the response from knowledge_agent is empty or inadequate, **run the searcher**.
-        - Stakeholder reactions: Include responses from industry bodies/opposition.
-        - Format the response with clear headings:
-          - **📌 Overview**: A brief summary of the budget point in question.
-          - **📊 Details**: In-depth analysis, including any numerical data, policy implications, or sector-specific impacts.
-          - **✅ Conclusion**: Summarize key takeaways, expected outcomes, or areas for further research.
-          -- **Numerical Data**: Tables or figures for budgetary allocations and expenditures.
-          -- **Sources**: Cite documents or URLs where applicable.
-        - Comparisons with previous budgets for trend analysis.
-        - Use markdown for formatting outputs, including bullet points, tables, or code blocks for clarity.
-        - If the query lacks clarity, prompt the user for additional details or clarification.
-        - Maintain a formal and professional tone in responses, always citing sources where applicable.
-        - Use bullet points for clarity.
-        
-    """),
-    expected_output=dedent("""\
-        # {Compelling Headline}                   
-        ### Overview
-        - Here's a brief summary of the budget analysis for the query.
-        ### Details
-        - Detailed breakdown including numbers, policies, and sector analysis.
-        ## Expert Insights
-        - Quotes from economists and market analysts
-        ## Numerical Breakdown
-        - Create comparative tables for allocations:
-            | Sector | 2024-25 | 2025-26 | Change (%) |
-            |--------|---------|---------|------------|
-            | Health | 89,000cr| 1,05,000cr | +18%     |
-        ## Geographic Distribution
-        - State-wise fund allocation patterns
-        - Special focus regions/aspirational districts
-        Always include:
-        - Reference to specific document/page numbers
-        - Source URLs for web-sourced information
-        - Last updated timestamps for time-sensitive data                           
-        ## Sources & Methodology
-        - Description of research process and sources
-        - page number of pdfs and source page name and file name
-        - website urls list 
-        ## For technical queries:
-        - Create flowchart for complex processes
-        - Use code blocks for formula explanations
-        - Add footnotes for legal citations        
-                                                                                                    
-        ### Conclusion
-        - Key insights and implications from the budget analysis.
-        - Suggested compliance strategies.
-                           
-        ### Visualization
-        - "**📈 Data Visualization** (if applicable):"
-        - "**Table**: For numerical comparisons, "
-        - Include tables/pie charts when data is sufficient (3+ points) and relevant.
-        ---
-        Research conducted by Financial Agent
-        Credit Rating Style Report
-        Published: {current_date}
-        Last Updated: {current_time}                                                    
-    """),
-    add_datetime_to_instructions=True,
-    markdown=True,
-    show_tool_calls=True,
-)
+answer_cache = get_answer_cache()
+table_store = get_table_store()
+# Spans around fetching, ingestion, embedding, search, model and tool calls; exporters via TRACE_EXPORTERS
+tracer = get_tracer()
 
 # Streamlit UI for User Input
 query = st.text_input("🔍 Enter your budget-related query:", placeholder="E.g., What are the major tax changes in Budget 2025?")
@@ -375,28 +133,83 @@ button_css = """
 """
 st.markdown(button_css, unsafe_allow_html=True)
 
+# Arguments of every query_budget_table call made during a run
+def table_queries(tools):
+    queries = []
+    for tool in tools or []:
+        if tool.get("tool_name") == "query_budget_table" and tool.get("tool_args") not in queries:
+            queries.append(tool.get("tool_args"))
+    return queries
+
+# Charts come straight from the structured budget tables the agent queried
+def render_table_charts(queries):
+    for args in queries:
+        # The arguments come from the model; a bad one must not spoil the answer above
+        try:
+            rows = table_store.query(**args)
+        except Exception as e:
+            st.caption(f"⚠️ Could not chart {args.get('item', 'this table')}: {e}")
+            continue
+        if not rows:
+            continue
+        title = f"{args.get('item', 'Budget')} (₹ crore)"
+        if len({row["period"] for row in rows}) == 1 and len(rows) >= 3:
+            fig = px.pie(values=[row["value"] for row in rows], names=[row["item"] for row in rows], title=title)
+        else:
+            fig = px.bar(rows, x="item", y="value", color="period", barmode="group", title=title)
+        st.plotly_chart(fig)
+
+stream_response = st.toggle("⚡ Stream response", value=True)
+
+# Renders the answer token by token and lists delegations/tool calls as they happen
+def stream_answer(query):
+    progress = st.status("📊 Analyzing budget data...", expanded=False)
+    placeholder = st.empty()
+    content = ""
+    queries = []
+    for chunk in agent_registry.run_stream(query, markdown=True):
+        if chunk.event == RunEvent.tool_call_started.value and chunk.tools:
+            progress.write(describe_tool_call(chunk.tools[-1]))
+            queries += [args for args in table_queries(chunk.tools[-1:]) if args not in queries]
+        elif chunk.event == RunEvent.run_response.value and isinstance(chunk.content, str):
+            content += chunk.content
+            placeholder.markdown(content + "▌", unsafe_allow_html=True)
+    placeholder.markdown(content, unsafe_allow_html=True)
+    progress.update(label="✅ Analysis complete", state="complete")
+    return content, queries
+
 # Button to Generate Response
 if st.button("🚀 Generate Response"):
-    if query:
-        with st.spinner("📊 Analyzing budget data... Please wait."):
-            try:
-                run_response = budget_agent.run(query, markdown=True)
-                st.markdown(run_response.content, unsafe_allow_html=True)
-                # Check for pie chart data in response
-                pie_chart_match = re.search(r"Pie Chart:.*?(?=###|\n\n|$)", run_response.content, re.DOTALL)
-                if pie_chart_match:
-                    pie_text = pie_chart_match.group()
-                    labels = []
-                    values = []
-                    for line in pie_text.split("\n")[1:]:
-                        if line.strip().startswith("-"):
-                            label, value = line.split(":")
-                            labels.append(label.strip("- ").strip())
-                            values.append(float(value.strip().replace("%", "")))
-                    fig = px.pie(values=values, names=labels, title="Budget Allocation")
-                    st.plotly_chart(fig)
-            except Exception as e:
-                st.error(f"⚠️ An error occurred: {str(e)}. Please try again or contact support.")
+    if agent_registry.knowledge is None:
+        st.warning("⏳ The knowledge base is still being built. Please try again in a few minutes.")
+    elif query:
+        try:
+            with tracer.span("query", stream=stream_response) as query_span:
+                kb_version = agent_registry.knowledge.ingestion_version
+                with tracer.span("answer_cache.get"):
+                    cached = answer_cache.get(query, kb_version)
+                query_span.set(cached=cached is not None)
+                if cached is not None:
+                    content, queries = cached
+                    st.caption("⚡ Served from answer cache")
+                    st.markdown(content, unsafe_allow_html=True)
+                elif stream_response:
+                    content, queries = stream_answer(query)
+                    answer_cache.put(query, content, kb_version, charts=queries)
+                else:
+                    with st.spinner("📊 Analyzing budget data... Please wait."):
+                        run_response = agent_registry.run(query, markdown=True)
+                    content = run_response.content
+                    queries = table_queries(run_response.tools)
+                    answer_cache.put(query, content, kb_version, charts=queries)
+                    st.markdown(content, unsafe_allow_html=True)
+                # Charts are drawn once the full answer is available
+                render_table_charts(queries)
+            st.session_state["last_trace_id"] = query_span.trace_id
+        except (SchedulerBusy, RegistryBusy):
+            st.warning("⏳ Many people are asking questions right now. Please try again in a minute.")
+        except Exception as e:
+            st.error(f"⚠️ An error occurred: {str(e)}. Please try again or contact support.")
     else:
         st.warning("⚠️ Please enter a query before generating a response!")
 
@@ -416,6 +229,56 @@ st.sidebar.markdown("""
 3️⃣ **Formatted AI Response** 📊  
 """)
 
+st.sidebar.subheader("📦 Knowledge Base")
+job = ingestion_worker.status()
+if job["state"] == "running":
+    st.sidebar.progress(job["progress"], text=job["message"] or "🔄 Refreshing...")
+elif job["state"] == "failed":
+    st.sidebar.error(f"⚠️ Last refresh failed: {job['error']}")
+if job["finished_at"]:
+    st.sidebar.caption(
+        f"Version {job['version']} · refreshed {time.strftime('%Y-%m-%d %H:%M', time.localtime(job['finished_at']))}"
+    )
+if job["warnings"]:
+    with st.sidebar.expander(f"⚠️ {len(job['warnings'])} warning(s)"):
+        for warning in job["warnings"]:
+            st.write(warning)
+if st.sidebar.button("🔄 Refresh Knowledge Base", disabled=job["state"] == "running"):
+    ingestion_worker.request_refresh()
+
+st.sidebar.subheader("⚡ Answer Cache")
+cache_stats = answer_cache.stats()
+col1, col2 = st.sidebar.columns(2)
+col1.metric("Hits", cache_stats["hits"])
+col2.metric("Misses", cache_stats["misses"])
+st.sidebar.caption(f"{cache_stats['semantic_hits']} near-duplicate hits · {cache_stats['entries']} cached answers")
+web_stats = web_cache.stats()
+st.sidebar.caption(
+    f"🌍 Web cache: {web_stats['hits']} hits, {web_stats['misses']} live searches · "
+    f"{web_stats['searches']} queries, {web_stats['chunks']} chunks stored"
+)
+
+agent_stats = agent_registry.stats()
+st.sidebar.caption(
+    f"🤖 {agent_stats['teams_built']} agent team(s) built in {agent_stats['construction_seconds']} s · "
+    f"{agent_stats['runs']} runs, avg {agent_stats['avg_run_seconds'] or '-'} s, "
+    f"last first token {agent_stats['last_first_token_seconds'] or '-'} s"
+)
+
+scheduler_stats = get_scheduler().stats()
+st.sidebar.caption(
+    f"🚦 Gemini calls: {scheduler_stats['in_flight']} in flight · {scheduler_stats['queued_interactive']} queries "
+    f"and {scheduler_stats['queued_background']} ingestion calls queued · {scheduler_stats['retries']} retries, "
+    f"{scheduler_stats['throttled']} rate-limited · avg wait {scheduler_stats['avg_wait_seconds']} s"
+)
+
+if st.sidebar.toggle("⏱️ Latency breakdown", value=False):
+    breakdown = trace_breakdown(tracer.recent.spans(st.session_state.get("last_trace_id")))
+    if breakdown:
+        st.sidebar.dataframe(breakdown, hide_index=True, use_container_width=True)
+    else:
+        st.sidebar.caption("Run a query to see where its time went.")
+
 st.sidebar.subheader("💡 Example Queries")
 st.sidebar.markdown("""
 - What are the major tax changes in Budget 2025?
@@ -0,0 +1,383 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Keep agno from posting run telemetry; the benchmark must not touch the network
+os.environ.setdefault("AGNO_API_ENABLED", "false")
+# The fake provider has no quota; set these to benchmark under the real Gemini rate limits
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("EMBEDDING_RPM", "1000000")
+
+import numpy as np
+from agno.embedder.google import GeminiEmbedder
+from google.genai import types
+from pypdf import PdfReader, PdfWriter
+
+from agents import AgentRegistry
+from embedding_cache import CachedEmbedder
+from knowledge import LOCAL_PDFS, open_snapshot, refresh_knowledge_base
+from retrieval import tokenize
+
+RESULTS_PATH = "tmp/benchmark/results.json"
+TOP_K = 5
+SEARCH_REPEATS = 5
+# Relative slowdown (or recall drop) against the baseline that counts as a regression
+TOLERANCE = 0.2
+
+# Left in every scratch directory the benchmark sets up; only directories carrying it are cleared,
+# so a --workdir pointing at the app's own tmp/ is refused instead of wiped
+WORKDIR_MARKER = ".budget-benchmark"
+WORKDIR_CONTENTS = ["fixtures", "embedding_cache", "lancedb", "http_cache", "tables"]
+
+# Questions over Union_Budget_FY25-26.pdf and a phrase the retrieved context must contain
+GOLDEN_QUESTIONS = [
+    {"question": "What is the fiscal deficit for FY26BE in rupees?", "answer": "fiscal deficit of Rs15.7 lakh cr"},
+    {"question": "How much capital expenditure is budgeted for FY26?", "answer": "Rs11.2 lakh cr"},
+    {"question": "What is the customs duty on solar modules now?", "answer": "solar modules has been reduced from 40% to 20%"},
+    {"question": "How many life-saving drugs were added to the BCD exemption list?", "answer": "36 new life-saving drugs"},
+    {"question": "What is the net tax revenue pegged at for FY26?", "answer": "Net tax rev. pegged at Rs28.4 lakh cr"},
+    {"question": "What is the allocation to PM Surya Ghar Muft Bijli Yojana?", "answer": "Rs20,000cr in FY26BE"},
+    {"question": "What is the new FDI limit for the insurance sector?", "answer": "FDI limit for the insurance sector to 100%"},
+    {"question": "What outlay is set for Small Modular Reactors?", "answer": "Small Modular Reactors"},
+    {"question": "How much is the fertilizer subsidy for FY26?", "answer": "Rs1.68 lakh cr"},
+    {"question": "How many oncology day care centers will be set up?", "answer": "200 oncology day care centers"},
+    {"question": "What is the capex outlay on the road sector?", "answer": "Rs2.72 lakh cr"},
+    {"question": "What Nifty EPS is expected for FY26E?", "answer": "Nifty EPS of 1184"},
+    {"question": "How are ULIPs with high annual premiums taxed?", "answer": "ULIPs with annual premiums exceeding"},
+    {"question": "Until when is the Jal Jeevan Mission extended?", "answer": "Jal Jeevan Mission extended until 2028"},
+]
+
+# Fixture documents cut from the local budget PDF: (file name, page numbers)
+FIXTURE_PDFS = [("budget_highlights.pdf", range(2, 11)), ("sector_impact.pdf", range(16, 32))]
+FIXTURE_PAGES = [("direct-tax.html", 11), ("indirect-tax.html", 13), ("infrastructure.html", 23)]
+
+# (section, metric) -> whether lower or higher is better
+METRICS = {
+    ("ingestion", "cold_seconds"): "lower",
+    ("ingestion", "warm_seconds"): "lower",
+    ("ingestion", "chunks_per_second"): "higher",
+    ("retrieval", "p50_ms"): "lower",
+    ("retrieval", "p95_ms"): "lower",
+    ("retrieval", "recall_at_k"): "higher",
+    ("agent", "p50_ms"): "lower",
+    ("agent", "p95_ms"): "lower",
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def normalize_whitespace(text):
+    return " ".join(text.split())
+
+
+# Writes the fixture PDFs and a small website (index page linking to one article per page)
+def build_fixtures(directory, source=LOCAL_PDFS[0]):
+    directory.mkdir(parents=True, exist_ok=True)
+    reader = PdfReader(source)
+    for name, pages in FIXTURE_PDFS:
+        writer = PdfWriter()
+        for page_number in pages:
+            writer.add_page(reader.pages[page_number - 1])
+        with open(directory / name, "wb") as f:
+            writer.write(f)
+    links = []
+    for name, page_number in FIXTURE_PAGES:
+        text = reader.pages[page_number - 1].extract_text() or ""
+        paragraphs = "".join(f"<p>{line}</p>" for line in text.splitlines() if line.strip())
+        (directory / name).write_text(f"<html><body><article>{paragraphs}</article></body></html>")
+        links.append(f'<li><a href="{name}">{name.split(".")[0]}</a></li>')
+    (directory / "index.html").write_text(
+        f"<html><body><main><h1>Union Budget 2025-26</h1><ul>{''.join(links)}</ul></main></body></html>"
+    )
+    return [name for name, _ in FIXTURE_PDFS], ["index.html"]
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serves the fixture directory on localhost in place of the government and news sites
+class FixtureServer:
+    def __init__(self, directory, latency=0.0):
+        handler = type("FixtureHandler", (_FixtureHandler,), {"latency": latency})
+        self.server = ThreadingHTTPServer(("localhost", 0), partial(handler, directory=str(directory)))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://localhost:{self.server.server_address[1]}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Deterministic feature-hashed bag-of-words vector: texts sharing terms land close together
+def fake_embedding(text, dimensions):
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token, count in Counter(tokenize(text)).items():
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += (1.0 if digest[4] & 1 else -1.0) * (1 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+# Stands in for google.genai.Client (client.models.embed_content / generate_content) so the
+# real GeminiEmbedder, CachedEmbedder and agno Gemini model run unchanged. The model searches
+# the knowledge base or delegates to the knowledge agent once, then answers from the result.
+class FakeGeminiClient:
+    def __init__(self, embed_latency=0.0, model_latency=0.0):
+        self.models = self
+        self.embed_latency = embed_latency
+        self.model_latency = model_latency
+        self.embed_requests = 0
+        self.generate_requests = 0
+        self._lock = threading.Lock()
+
+    def embed_content(self, model, contents, config=None):
+        with self._lock:
+            self.embed_requests += 1
+        time.sleep(self.embed_latency)
+        dimensions = (config or {}).get("output_dimensionality") or 768
+        texts = [contents] if isinstance(contents, str) else contents
+        return types.EmbedContentResponse(
+            embeddings=[types.ContentEmbedding(values=fake_embedding(text, dimensions)) for text in texts]
+        )
+
+    def _reply(self, contents, config):
+        names = [
+            declaration.name
+            for tool in (config.tools if config and config.tools else [])
+            for declaration in tool.function_declarations or []
+        ]
+        parts = contents[-1].parts or []
+        results = [part.function_response.response.get("result") for part in parts if part.function_response]
+        if results:
+            context = normalize_whitespace(" ".join(str(result) for result in results))
+            return types.Part.from_text(text=f"Based on the retrieved context: {context[:500]}")
+        question = next((part.text for part in parts if part.text), "").split("\n")[0]
+        if "search_knowledge_base" in names:
+            return types.Part.from_function_call(name="search_knowledge_base", args={"query": question})
+        transfers = [name for name in names if name.startswith("transfer_task_to_") and "searcher" not in name.lower()]
+        if transfers:
+            return types.Part.from_function_call(
+                name=transfers[0], args={"task_description": question, "expected_output": "A short cited answer."}
+            )
+        return types.Part.from_text(text=f"No source available for: {question}")
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.generate_requests += 1
+        time.sleep(self.model_latency)
+        part = self._reply(contents, config)
+        prompt_tokens = sum(len((p.text or "").split()) for content in contents for p in content.parts or [])
+        output_tokens = len((part.text or "").split())
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+    def generate_content_stream(self, model, contents, config=None):
+        yield self.generate_content(model, contents, config)
+
+
+# Clears what an earlier run left in workdir; anything else there is never touched
+def prepare_workdir(workdir):
+    workdir = Path(workdir)
+    if workdir.exists() and any(workdir.iterdir()) and not (workdir / WORKDIR_MARKER).exists():
+        raise ValueError(f"{workdir} is not empty and was not created by the benchmark; use a new or empty directory")
+    for name in WORKDIR_CONTENTS:
+        shutil.rmtree(workdir / name, ignore_errors=True)
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / WORKDIR_MARKER).touch()
+    return workdir
+
+
+def run_benchmark(
+    workdir,
+    top_k=TOP_K,
+    repeats=SEARCH_REPEATS,
+    agent_runs=len(GOLDEN_QUESTIONS),
+    embed_latency=0.0,
+    model_latency=0.0,
+    web_latency=0.0,
+):
+    workdir = prepare_workdir(workdir)
+    pdf_files, website_files = build_fixtures(workdir / "fixtures")
+    client = FakeGeminiClient(embed_latency=embed_latency, model_latency=model_latency)
+    embedder = CachedEmbedder(
+        embedder=GeminiEmbedder(id="models/text-embedding-004", dimensions=768, gemini_client=client),
+        cache_dir=str(workdir / "embedding_cache"),
+    )
+    uri = str(workdir / "lancedb")
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "top_k": top_k,
+            "search_repeats": repeats,
+            "embed_latency": embed_latency,
+            "model_latency": model_latency,
+            "web_latency": web_latency,
+        },
+    }
+
+    with FixtureServer(workdir / "fixtures", latency=web_latency) as server:
+        ingest = partial(
+            refresh_knowledge_base,
+            embedder,
+            pdf_urls=[server.base_url + name for name in pdf_files],
+            website_urls=[server.base_url + name for name in website_files],
+            cache_dir=workdir / "http_cache",
+            uri=uri,
+            tables_dir=workdir / "tables",
+        )
+        start = time.perf_counter()
+        knowledge_base, warnings = ingest()
+        cold_seconds = time.perf_counter() - start
+        chunks = knowledge_base.vector_db.get_count()
+        embed_requests = client.embed_requests
+        start = time.perf_counter()
+        ingest()
+        warm_seconds = time.perf_counter() - start
+    results["ingestion"] = {
+        "cold_seconds": round(cold_seconds, 3),
+        "warm_seconds": round(warm_seconds, 3),
+        "chunks": chunks,
+        "chunks_per_second": round(chunks / cold_seconds, 2) if cold_seconds else None,
+        "embedding_requests": embed_requests,
+        "warnings": warnings,
+    }
+
+    snapshot = open_snapshot(embedder, uri=uri)
+    timings = []
+    hits = 0
+    for item in GOLDEN_QUESTIONS:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            documents = snapshot.vector_db.search(item["question"], limit=top_k)
+            timings.append((time.perf_counter() - start) * 1000)
+        answer = normalize_whitespace(item["answer"])
+        hits += any(answer in normalize_whitespace(document.content) for document in documents)
+    results["retrieval"] = {
+        "k": top_k,
+        "queries": len(GOLDEN_QUESTIONS),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "recall_at_k": round(hits / len(GOLDEN_QUESTIONS), 3),
+    }
+
+    registry = AgentRegistry(api_key="benchmark", knowledge=snapshot, pool_size=1, client=client)
+    generate_requests = client.generate_requests
+    timings = []
+    for item in GOLDEN_QUESTIONS[:agent_runs]:
+        start = time.perf_counter()
+        registry.run(item["question"])
+        timings.append((time.perf_counter() - start) * 1000)
+    results["agent"] = {
+        "runs": len(timings),
+        "p50_ms": round(percentile(timings, 50), 2) if timings else None,
+        "p95_ms": round(percentile(timings, 95), 2) if timings else None,
+        "model_requests": client.generate_requests - generate_requests,
+        "team_construction_seconds": registry.stats()["construction_seconds"],
+    }
+    return results
+
+
+# Metrics that got worse than the baseline by more than tolerance
+def regressions(results, baseline, tolerance=TOLERANCE):
+    found = []
+    for (section, metric), better in METRICS.items():
+        current = results.get(section, {}).get(metric)
+        previous = baseline.get(section, {}).get(metric)
+        if current is None or previous is None:
+            continue
+        if better == "lower" and current > previous * (1 + tolerance):
+            found.append(f"{section}.{metric}: {previous} -> {current}")
+        elif better == "higher" and current < previous * (1 - tolerance):
+            found.append(f"{section}.{metric}: {previous} -> {current}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion, retrieval and agent benchmark")
+    parser.add_argument("--workdir", help="Scratch directory, new or from an earlier run (default: a temp dir)")
+    parser.add_argument("--output", default=RESULTS_PATH, help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--repeats", type=int, default=SEARCH_REPEATS, help="Searches per golden question")
+    parser.add_argument("--agent-runs", type=int, default=len(GOLDEN_QUESTIONS))
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per fake embedding request")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Seconds per fake Gemini request")
+    parser.add_argument("--web-latency", type=float, default=0.0, help="Seconds per fixture HTTP request")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="budget-benchmark-")
+    try:
+        workdir = prepare_workdir(workdir)
+    except ValueError as e:
+        parser.error(str(e))
+    results = run_benchmark(
+        workdir,
+        top_k=args.top_k,
+        repeats=args.repeats,
+        agent_runs=args.agent_runs,
+        embed_latency=args.embed_latency,
+        model_latency=args.model_latency,
+        web_latency=args.web_latency,
+    )
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    ingestion, retrieval, agent = results["ingestion"], results["retrieval"], results["agent"]
+    print(
+        f"ingestion: cold {ingestion['cold_seconds']} s, warm {ingestion['warm_seconds']} s, "
+        f"{ingestion['chunks']} chunks ({ingestion['chunks_per_second']} chunks/s)"
+    )
+    print(
+        f"retrieval: p50 {retrieval['p50_ms']} ms, p95 {retrieval['p95_ms']} ms, "
+        f"recall@{retrieval['k']} {retrieval['recall_at_k']}"
+    )
+    print(f"agent: p50 {agent['p50_ms']} ms, p95 {agent['p95_ms']} ms over {agent['runs']} runs")
+    print(f"results written to {output}")
+
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+
+import numpy as np
+from agno.utils.log import logger
+
+from retrieval import tokenize
+from tracing import get_tracer
+
+# Prompt tokens the retrieved references may take per knowledge search
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Candidates fetched per requested document, for MMR to choose from
+CANDIDATE_MULTIPLIER = 3
+# 1.0 ranks purely by relevance, 0.0 purely by novelty
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks this similar to one already selected add nothing
+REDUNDANCY_THRESHOLD = 0.92
+# Chunks scoring below this fraction of the best chunk's relevance are dropped
+MIN_RELATIVE_RELEVANCE = 0.5
+ENCODING = "cl100k_base"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+# tiktoken's cl100k_base as a stand-in for the Gemini tokenizer. It downloads its BPE file
+# on first use, so without network access we fall back to ~4 characters per token.
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(ENCODING)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+# Same serialisation agno uses when it pastes references into the prompt
+def references_tokens(references):
+    return count_tokens(json.dumps(references, indent=2)) if references else 0
+
+
+def _normalized(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _lexical_similarity(texts):
+    terms = [set(tokenize(text)) for text in texts]
+    return np.array(
+        [[len(a & b) / (len(a | b) or 1) for b in terms] for a in terms],
+        dtype=np.float32,
+    )
+
+
+# Greedy maximal marginal relevance over candidates already in retrieval order. Returns
+# indices to keep, most useful first, without near-duplicates or weakly relevant chunks.
+def mmr_select(relevance, similarity, mmr_lambda=MMR_LAMBDA):
+    if len(relevance) == 0:
+        return []
+    floor = relevance.max() * MIN_RELATIVE_RELEVANCE if relevance.max() > 0 else -np.inf
+    remaining = [index for index in range(len(relevance)) if relevance[index] >= floor]
+    selected = []
+    while remaining:
+        if selected:
+            novelty = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            novelty = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * novelty
+        best = int(np.argmax(scores))
+        index = remaining.pop(best)
+        if selected and novelty[best] >= REDUNDANCY_THRESHOLD:
+            continue
+        selected.append(index)
+    return selected
+
+
+# agno Agent retriever: fetches extra candidates, keeps a diverse, relevant subset and packs
+# it into CONTEXT_TOKEN_BUDGET tokens, in place of pasting the top-k chunks verbatim
+class ContextAssembler:
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=MMR_LAMBDA, web_cache=None):
+        self.token_budget = token_budget
+        # Cached web results compete with knowledge base chunks for the same budget
+        self.web_cache = web_cache
+        self.mmr_lambda = mmr_lambda
+        self.queries = 0
+        self.tokens_saved = 0
+
+    def _scores(self, embedder, query, documents):
+        embeddings = [document.embedding for document in documents]
+        if embedder is not None and all(embedding is not None and len(embedding) for embedding in embeddings):
+            # The search just embedded this query, so this is an embedding cache hit
+            query_vector = _normalized([embedder.get_embedding(query)])[0]
+            matrix = _normalized(embeddings)
+            return matrix @ query_vector, matrix @ matrix.T
+        # No stored vectors: rank position for relevance, shared terms for similarity
+        relevance = np.array([1.0 / (rank + 1) for rank in range(len(documents))], dtype=np.float32)
+        return relevance, _lexical_similarity([document.content for document in documents])
+
+    def _candidates(self, knowledge, query, num_documents):
+        documents = []
+        if knowledge is not None:
+            documents += knowledge.search(query=query, num_documents=num_documents * CANDIDATE_MULTIPLIER)
+        if self.web_cache is not None:
+            try:
+                documents += self.web_cache.search(query, num_documents)
+            except Exception as e:
+                logger.warning(f"Web cache search failed: {e}")
+        return documents
+
+    # Returns the references to send and the tokens they save over agno's plain top-k
+    def assemble(self, knowledge, query, num_documents=None):
+        num_documents = num_documents or getattr(knowledge, "num_documents", 5)
+        documents = self._candidates(knowledge, query, num_documents)
+        if not documents:
+            return None, 0
+        # What agno would have sent: the top num_documents chunks, whole
+        baseline = references_tokens([document.to_dict() for document in documents[:num_documents]])
+
+        # Diversity may swap in longer chunks; never send more than the top-k would have
+        budget = min(self.token_budget, baseline)
+
+        embedder = getattr(knowledge.vector_db, "embedder", None) if knowledge is not None else None
+        if embedder is None and self.web_cache is not None:
+            embedder = self.web_cache.embedder
+        relevance, similarity = self._scores(embedder, query, documents)
+        references = []
+        used = 0
+        for index in mmr_select(relevance, similarity, self.mmr_lambda)[:num_documents]:
+            reference = documents[index].to_dict()
+            tokens = references_tokens([reference])
+            if used + tokens > budget:
+                if references:
+                    continue
+                # Never return nothing: cut the single best chunk down to the budget
+                overhead = tokens - count_tokens(reference["content"])
+                reference["content"] = truncate_to_tokens(reference["content"], max(0, budget - overhead))
+                tokens = references_tokens([reference])
+            references.append(reference)
+            used += tokens
+
+        saved = baseline - used
+        self.queries += 1
+        self.tokens_saved += saved
+        logger.info(
+            f"Context for '{query[:60]}': {len(references)} of {len(documents)} candidates, "
+            f"{used} tokens ({saved} saved vs top-{num_documents})"
+        )
+        return references, saved
+
+    def __call__(self, agent, query, num_documents=None, **kwargs):
+        with get_tracer().span("context.assemble") as span:
+            references, saved = self.assemble(agent.knowledge, query, num_documents)
+            span.set(references=len(references or []), tokens_saved=saved)
+            return references
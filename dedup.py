@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from answer_cache import normalize_query, numeric_tokens
+
+# Max differing SimHash bits for two chunks to count as the same passage
+MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+# Shorter chunks carry too few shingles for a stable fingerprint; they only dedup exactly
+MIN_WORDS = 20
+SHINGLE_SIZE = 3
+# 64 bits split in 4 bands: two fingerprints within 3 bits always share at least one band
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+
+def simhash(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = [" ".join(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    digests = b"".join(hashlib.blake2b(shingle.encode(), digest_size=8).digest() for shingle in shingles)
+    # One row of 64 bits per shingle; a fingerprint bit is set where most shingles have it set
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(-1, 64)
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int("".join("1" if vote else "0" for vote in votes), 2)
+
+
+# Chunks that differ only in a figure or a year are different facts, not duplicates: near
+# matches must also carry the same digit-bearing tokens (the answer cache's rule)
+def figures(text):
+    tokens = sorted(numeric_tokens(normalize_query(text)))
+    return hashlib.blake2b(" ".join(tokens).encode(), digest_size=8).hexdigest()
+
+
+def bands(signature):
+    mask = (1 << BAND_BITS) - 1
+    return [(band, signature >> (band * BAND_BITS) & mask) for band in range(BANDS)]
+
+
+# SQLite stores signed 64-bit integers
+def _to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# Canonical chunk fingerprints plus every (source, document, page) a chunk was seen in.
+# Lives next to the LanceDB table, e.g. tmp/lancedb/combined_documents.dedup.sqlite
+class DedupIndex:
+    def __init__(self, path, max_distance=MAX_DISTANCE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, simhash INTEGER NOT NULL, figures TEXT);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, value INTEGER, id TEXT);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value);
+            CREATE TABLE IF NOT EXISTS provenance (id TEXT, source TEXT, name TEXT, page INTEGER);
+            CREATE INDEX IF NOT EXISTS provenance_id ON provenance (id);
+            CREATE INDEX IF NOT EXISTS provenance_source ON provenance (source);
+            """
+        )
+        # Indexes written before figures were recorded: their chunks only dedup exactly
+        if "figures" not in {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}:
+            self._db.execute("ALTER TABLE chunks ADD COLUMN figures TEXT")
+
+    # Canonical id of an already stored near-duplicate of this signature, if any
+    def near_duplicate(self, signature, chunk_figures):
+        if signature is None:
+            return None
+        candidates = set()
+        for band, value in bands(signature):
+            rows = self._db.execute("SELECT id FROM bands WHERE band = ? AND value = ?", (band, value))
+            candidates.update(row[0] for row in rows)
+        best = None
+        for chunk_id in candidates:
+            stored, stored_figures = self._db.execute(
+                "SELECT simhash, figures FROM chunks WHERE id = ?", (chunk_id,)
+            ).fetchone()
+            if stored_figures != chunk_figures:
+                continue
+            distance = bin(_to_unsigned(stored) ^ signature).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, chunk_id)
+        return best[1] if best else None
+
+    def add_canonical(self, chunk_id, signature, chunk_figures):
+        if signature is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", (chunk_id, _to_signed(signature), chunk_figures)
+        )
+        self._db.execute("DELETE FROM bands WHERE id = ?", (chunk_id,))
+        self._db.executemany(
+            "INSERT INTO bands VALUES (?, ?, ?)", [(band, value, chunk_id) for band, value in bands(signature)]
+        )
+
+    def add_provenance(self, chunk_id, source, document):
+        self._db.execute(
+            "INSERT INTO provenance VALUES (?, ?, ?, ?)",
+            (chunk_id, source, document.name, document.meta_data.get("page")),
+        )
+
+    def forget_source(self, source):
+        self._db.execute("DELETE FROM provenance WHERE source = ?", (source,))
+
+    # Stops these chunks matching as near-duplicates; their provenance is kept
+    def forget_signatures(self, chunk_ids):
+        rows = [(chunk_id,) for chunk_id in chunk_ids]
+        self._db.executemany("DELETE FROM chunks WHERE id = ?", rows)
+        self._db.executemany("DELETE FROM bands WHERE id = ?", rows)
+
+    def remove(self, chunk_ids):
+        rows = [(chunk_id,) for chunk_id in chunk_ids]
+        self._db.executemany("DELETE FROM chunks WHERE id = ?", rows)
+        self._db.executemany("DELETE FROM bands WHERE id = ?", rows)
+        self._db.executemany("DELETE FROM provenance WHERE id = ?", rows)
+
+    def clear(self):
+        self._db.executescript("DELETE FROM chunks; DELETE FROM bands; DELETE FROM provenance;")
+
+    # Every place each chunk was seen, keyed by chunk id
+    def sources_for(self, chunk_ids):
+        sources = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                rows = self._db.execute(
+                    "SELECT DISTINCT source, name, page FROM provenance WHERE id = ?", (chunk_id,)
+                ).fetchall()
+                sources[chunk_id] = [{"source": source, "name": name, "page": page} for source, name, page in rows]
+        return sources
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from agno.embedder.base import Embedder
+from agno.embedder.google import GeminiEmbedder
+from agno.utils.log import logger
+
+from admission import get_scheduler
+from tracing import get_tracer, in_current_context
+
+CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "tmp/embedding_cache")
+# text-embedding-004 accepts at most 100 texts per request
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+# Append-only float32 store: vectors.f32 holds one row per embedding, keys.txt the matching
+# text hashes. Reads go through a memory map that is widened as rows are appended.
+class EmbeddingStore:
+    def __init__(self, directory, dimensions):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimensions = dimensions
+        self.vectors_path = self.directory / "vectors.f32"
+        self.keys_path = self.directory / "keys.txt"
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._mmap = None
+        self._load()
+
+    def _load(self):
+        keys = self.keys_path.read_text().split() if self.keys_path.exists() else []
+        row_bytes = self.dimensions * 4
+        stored_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        # A crash between the two appends can leave one file a row ahead; trust the shorter
+        count = min(len(keys), stored_rows)
+        if count < len(keys) or count < stored_rows:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * row_bytes)
+            self.keys_path.write_text("".join(f"{key}\n" for key in keys[:count]))
+        self._rows = {key: row for row, key in enumerate(keys[:count])}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _vectors(self, row):
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            self._mmap = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dimensions)
+            )
+        return self._mmap
+
+    def get(self, key):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return self._vectors(row)[row].tolist()
+
+    def put_many(self, items):
+        with self._lock:
+            items = [(key, vector) for key, vector in items if key not in self._rows]
+            # A short or empty vector would shift every later row off its key
+            malformed = [key for key, vector in items if len(vector) != self.dimensions]
+            if malformed:
+                logger.warning(f"Not caching {len(malformed)} embeddings without {self.dimensions} dimensions")
+                items = [(key, vector) for key, vector in items if len(vector) == self.dimensions]
+            if not items:
+                return
+            matrix = np.asarray([vector for _, vector in items], dtype=np.float32)
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_path, "a") as f:
+                f.write("".join(f"{key}\n" for key, _ in items))
+            start = len(self._rows)
+            for offset, (key, _) in enumerate(items):
+                self._rows[key] = start + offset
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    # Wraps another embedder with a persistent cache keyed by model, dimensions and text hash
+    embedder: Optional[Embedder] = None
+    cache_dir: str = CACHE_DIR
+    batch_size: int = BATCH_SIZE
+    max_concurrency: int = MAX_CONCURRENCY
+
+    def __post_init__(self):
+        self.dimensions = self.embedder.dimensions
+        self.model_id = getattr(self.embedder, "id", type(self.embedder).__name__)
+        task_type = getattr(self.embedder, "task_type", None) or "default"
+        namespace = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{self.model_id}-{self.dimensions}-{task_type}")
+        self.store = EmbeddingStore(Path(self.cache_dir) / namespace, self.dimensions)
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_batch(self, texts):
+        with get_tracer().span("embedding.batch", texts=len(texts)):
+            if isinstance(self.embedder, GeminiEmbedder):
+                config = {"output_dimensionality": self.embedder.dimensions, "task_type": self.embedder.task_type}
+                if self.embedder.title:
+                    config["title"] = self.embedder.title
+                response = get_scheduler().call(
+                    self.embedder.id,
+                    self.embedder.client.models.embed_content,
+                    model=self.embedder.id,
+                    contents=texts,
+                    config=config,
+                )
+                return [embedding.values for embedding in response.embeddings]
+            return [get_scheduler().call(self.model_id, self.embedder.get_embedding, text) for text in texts]
+
+    # Embeds every uncached text, coalescing misses into batched, concurrent requests
+    def embed_many(self, texts):
+        pending = {}
+        for text in texts:
+            key = text_key(text)
+            if key not in pending and self.store.get(key) is None:
+                pending[key] = text
+        self.hits += len(texts) - len(pending)
+        self.misses += len(pending)
+        if not pending:
+            return
+
+        items = list(pending.items())
+        batches = [items[i : i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+        def run(batch):
+            vectors = self._embed_batch([text for _, text in batch])
+            self.store.put_many([(key, vector) for (key, _), vector in zip(batch, vectors)])
+
+        logger.info(f"Embedding {len(items)} texts in {len(batches)} batches")
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            list(pool.map(in_current_context(run), batches))
+
+    def get_embedding(self, text):
+        with get_tracer().span("embedding.query") as span:
+            key = text_key(text)
+            vector = self.store.get(key)
+            span.set(cached=vector is not None)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+            vector = get_scheduler().call(self.model_id, self.embedder.get_embedding, text)
+            if vector:
+                self.store.put_many([(key, vector)])
+            return vector
+
+    # Document.embed() during insert(); embed_many() has just stored these texts, so the
+    # lookups are neither traced nor counted as hits
+    def get_embedding_and_usage(self, text):
+        vector = self.store.get(text_key(text))
+        if vector is not None:
+            return vector, None
+        return self.get_embedding(text), None
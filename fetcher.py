@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from agno.utils.log import logger
+from agno.knowledge.pdf_url import PDFUrlKnowledgeBase
+from agno.document.reader.pdf_reader import PDFReader
+from agno.document.reader.website_reader import WebsiteReader
+
+from pipeline import iter_pdf_batches, reader_chunking_strategy
+from tracing import get_tracer, in_current_context
+
+# Content-addressed HTTP cache shared by the knowledge bases.
+# Bodies live under objects/<sha256>, index.json maps url -> sha256 + validators.
+CACHE_DIR = Path(os.getenv("FETCH_CACHE_DIR", "tmp/http_cache"))
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+# Entries younger than this are served without touching the network at all
+MAX_AGE = int(os.getenv("FETCH_MAX_AGE", "86400"))
+TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (compatible; BudgetAnalysisAgent/1.0)"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    path: Optional[Path] = None
+    status: str = "failed"  # downloaded | revalidated | cached | failed
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.path is not None
+
+
+# One lock per cache directory: several HttpCache instances may share it within the process
+_save_locks = {}
+_save_locks_lock = threading.Lock()
+
+
+def _save_lock(directory):
+    with _save_locks_lock:
+        return _save_locks.setdefault(directory.resolve(), threading.Lock())
+
+
+class HttpCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.index_path = self.cache_dir / "index.json"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = self._read_index()
+        # url -> when it was removed; a copy fetched later by another instance is kept
+        self._removed = {}
+
+    def _read_index(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable fetch index at {self.index_path}")
+            return {}
+
+    # Merges into the index on disk, which other instances over the same directory may have
+    # written since this one was read; the most recently fetched entry per url wins
+    def save(self):
+        with _save_lock(self.cache_dir), self._lock:
+            index = self._read_index()
+            for url, removed_at in self._removed.items():
+                if index.get(url, {}).get("fetched_at", 0) <= removed_at:
+                    index.pop(url, None)
+            for url, entry in self._index.items():
+                if entry.get("fetched_at", 0) >= index.get(url, {}).get("fetched_at", 0):
+                    index[url] = entry
+            self._index = index
+            self._removed.clear()
+            tmp_path = self.index_path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps(self._index, indent=2))
+            os.replace(tmp_path, self.index_path)
+
+    def entry(self, url):
+        with self._lock:
+            entry = self._index.get(url)
+        if entry and (self.objects_dir / entry["sha256"]).exists():
+            return entry
+        return None
+
+    def path_for(self, url):
+        entry = self.entry(url)
+        return self.objects_dir / entry["sha256"] if entry else None
+
+    def read(self, url):
+        path = self.path_for(url)
+        return path.read_bytes() if path else None
+
+    def entries(self):
+        with self._lock:
+            return dict(self._index)
+
+    # Forgets url, and deletes its body unless another url has the same content
+    def remove(self, url):
+        with self._lock:
+            entry = self._index.pop(url, None)
+            self._removed[url] = time.time()
+            sha256 = entry.get("sha256") if entry else None
+            if sha256 and not any(other.get("sha256") == sha256 for other in self._index.values()):
+                (self.objects_dir / sha256).unlink(missing_ok=True)
+
+    def _touch(self, url, **fields):
+        with self._lock:
+            self._index.setdefault(url, {}).update(fields, fetched_at=time.time())
+
+    def store(self, url, response):
+        # Stream the body to disk while hashing so large PDFs never sit in memory
+        digest = hashlib.sha256()
+        tmp_path = self.objects_dir / f".{threading.get_ident()}.part"
+        with open(tmp_path, "wb") as f:
+            for block in response.iter_content(chunk_size=1 << 16):
+                digest.update(block)
+                f.write(block)
+        sha256 = digest.hexdigest()
+        os.replace(tmp_path, self.objects_dir / sha256)
+        self._touch(
+            url,
+            sha256=sha256,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_type=response.headers.get("Content-Type"),
+        )
+        return self.objects_dir / sha256
+
+
+def _make_session(max_workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+class Fetcher:
+    def __init__(self, cache=None, max_workers=MAX_WORKERS, max_age=MAX_AGE):
+        self.cache = cache or HttpCache()
+        self.max_workers = max_workers
+        self.max_age = max_age
+        self.session = _make_session(max_workers)
+
+    def fetch(self, url):
+        with get_tracer().span("fetch_url", url=url) as span:
+            result = self._fetch(url)
+            span.set(status=result.status)
+            return result
+
+    def _fetch(self, url):
+        entry = self.cache.entry(url)
+        if entry and time.time() - entry.get("fetched_at", 0) < self.max_age:
+            return FetchResult(url, self.cache.path_for(url), "cached")
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            with self.session.get(url, headers=headers, timeout=TIMEOUT, stream=True) as response:
+                if response.status_code == 304 and entry:
+                    self.cache._touch(url)
+                    return FetchResult(url, self.cache.path_for(url), "revalidated")
+                if response.status_code != 200:
+                    return self._fallback(url, entry, f"Status {response.status_code}")
+                return FetchResult(url, self.cache.store(url, response), "downloaded")
+        except requests.RequestException as e:
+            return self._fallback(url, entry, str(e))
+
+    def _fallback(self, url, entry, error):
+        # A stale copy is better than dropping the source when the site is flaky
+        if entry:
+            logger.warning(f"Serving stale cache for {url}: {error}")
+            return FetchResult(url, self.cache.path_for(url), "cached", error)
+        return FetchResult(url, None, "failed", error)
+
+    def fetch_many(self, urls):
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as pool:
+            results = list(pool.map(in_current_context(self.fetch), urls))
+        self.cache.save()
+        return results
+
+
+class CachedPDFUrlKnowledgeBase(PDFUrlKnowledgeBase):
+    # Same documents as PDFUrlKnowledgeBase, but parsed from the local fetch cache
+    reader: PDFReader = PDFReader()
+    cache_dir: str = str(CACHE_DIR)
+
+    def source_units(self):
+        # (source key, content hash, batch reader) triples, used for incremental ingestion.
+        # Pages are parsed in parallel straight from the cached file.
+        cache = HttpCache(self.cache_dir)
+        for url in self.urls:
+            entry = cache.entry(url)
+            if entry is None:
+                logger.warning(f"{url} is not in the fetch cache, skipping")
+                continue
+            doc_name = urlparse(url).path.split("/")[-1].split(".")[0]
+            yield url, entry["sha256"], partial(
+                iter_pdf_batches,
+                cache.path_for(url),
+                doc_name,
+                {"url": url},
+                reader_chunking_strategy(self.reader),
+            )
+
+    @property
+    def document_lists(self):
+        for _, _, read in self.source_units():
+            yield [document for batch in read() for document in batch]
+
+
+@dataclass
+class CachedWebsiteReader(WebsiteReader):
+    # Crawls like WebsiteReader, but every page goes through the shared fetch cache
+    cache_dir: str = str(CACHE_DIR)
+
+    def crawl(self, url, starting_depth=1):
+        fetcher = Fetcher(HttpCache(self.cache_dir))
+        primary_domain = self._get_primary_domain(url)
+        crawler_result = {}
+        frontier = [url]
+        seen = {url}
+        depth = starting_depth
+        while frontier and depth <= self.max_depth and len(crawler_result) < self.max_links:
+            next_frontier = []
+            for result in fetcher.fetch_many(frontier):
+                if not result.ok or len(crawler_result) >= self.max_links:
+                    continue
+                soup = BeautifulSoup(result.path.read_bytes(), "html.parser")
+                main_content = self._extract_main_content(soup)
+                if main_content:
+                    crawler_result[result.url] = main_content
+                for link in soup.find_all("a", href=True):
+                    full_url = urljoin(result.url, link["href"]).split("#")[0]
+                    parsed = urlparse(full_url)
+                    if (
+                        parsed.scheme in ("http", "https")
+                        and primary_domain in parsed.netloc
+                        and not parsed.path.endswith((".pdf", ".jpg", ".png"))
+                        and full_url not in seen
+                    ):
+                        seen.add(full_url)
+                        next_frontier.append(full_url)
+            frontier = next_frontier[: self.max_links - len(crawler_result)]
+            depth += 1
+        return crawler_result
+
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import time
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from agno.utils.log import logger
+from agno.knowledge.combined import CombinedKnowledgeBase
+from agno.knowledge.pdf import PDFKnowledgeBase
+from agno.knowledge.website import WebsiteKnowledgeBase
+
+from dedup import DedupIndex, figures, simhash
+from pipeline import IngestionPipeline, iter_pdf_batches, reader_chunking_strategy
+from tracing import get_tracer
+
+# Rows deleted per LanceDB delete() call when a source changes
+DELETE_BATCH_SIZE = 500
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_sha256(documents):
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.content.encode("utf-8", "replace"))
+    return digest.hexdigest()
+
+
+# Same row id LanceDb.insert() derives from a document
+def row_id(document):
+    cleaned_content = document.content.replace("\x00", "\ufffd")
+    return hashlib.md5(cleaned_content.encode()).hexdigest()
+
+
+def embedder_signature(embedder):
+    # Look through caching wrappers: the stored vectors come from the wrapped model
+    embedder = getattr(embedder, "embedder", None) or embedder
+    return f"{type(embedder).__name__}:{getattr(embedder, 'id', None)}:{embedder.dimensions}"
+
+
+# Anything that changes how a source is chunked must invalidate its rows
+def chunking_signature(kb):
+    reader = getattr(kb, "reader", None)
+    return json.dumps(
+        {
+            "reader": type(reader).__name__,
+            "chunk": getattr(reader, "chunk", None),
+            "chunk_size": getattr(reader, "chunk_size", None),
+            "strategy": type(getattr(reader, "chunking_strategy", None)).__name__,
+            "max_depth": getattr(kb, "max_depth", None),
+            "max_links": getattr(kb, "max_links", None),
+        },
+        sort_keys=True,
+    )
+
+
+# Yields (source key, content hash or None, batch reader) for every document a knowledge base
+# owns; the reader returns an iterable of document lists. A None hash means the source has to
+# be read before we can tell whether it changed.
+def iter_source_units(kb):
+    if hasattr(kb, "source_units"):
+        yield from kb.source_units()
+    elif isinstance(kb, PDFKnowledgeBase):
+        path = Path(kb.path)
+        pdf_paths = sorted(path.glob("**/*.pdf")) if path.is_dir() else [path]
+        for pdf_path in pdf_paths:
+            yield str(pdf_path), file_sha256(pdf_path), partial(
+                iter_pdf_batches, pdf_path, pdf_path.name.split(".")[0], {}, reader_chunking_strategy(kb.reader)
+            )
+    elif isinstance(kb, WebsiteKnowledgeBase):
+        for url in kb.urls:
+            yield url, None, (lambda url=url: [kb.reader.read(url=url)])
+    else:
+        for documents in kb.document_lists:
+            key = documents[0].name if documents else None
+            if key:
+                yield key, None, (lambda documents=documents: [documents])
+
+
+class IngestionManifest:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {"embedder": None, "version": 0, "sources": {}}
+        if self.path.exists():
+            try:
+                self.data.update(json.loads(self.path.read_text()))
+            except (OSError, ValueError):
+                logger.warning(f"Ignoring unreadable ingestion manifest at {self.path}")
+
+    @property
+    def version(self):
+        return self.data["version"]
+
+    @property
+    def embedder(self):
+        return self.data["embedder"]
+
+    def reset(self, embedder):
+        self.data = {"embedder": embedder, "version": self.version + 1, "sources": {}}
+
+    def get(self, key):
+        return self.data["sources"].get(key)
+
+    def is_current(self, key, content_hash, signature):
+        entry = self.get(key)
+        return bool(entry) and entry["hash"] == content_hash and entry["chunking"] == signature
+
+    def set(self, key, content_hash, signature, ids):
+        self.data["sources"][key] = {
+            "hash": content_hash,
+            "chunking": signature,
+            "ids": sorted(ids),
+            "ingested_at": time.time(),
+        }
+
+    def ids_used_by_others(self, key):
+        return {
+            row
+            for other_key, entry in self.data["sources"].items()
+            if other_key != key
+            for row in entry["ids"]
+        }
+
+    def bump_version(self):
+        self.data["version"] += 1
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.data))
+        os.replace(tmp_path, self.path)
+
+
+class IncrementalCombinedKnowledgeBase(CombinedKnowledgeBase):
+    # Defaults to <lancedb uri>/<table>.manifest.json so the manifest travels with the table
+    manifest_path: Optional[str] = None
+    # Manifest version of the loaded table; bumps whenever any source's rows change
+    ingestion_version: int = 0
+
+    def get_manifest(self):
+        path = self.manifest_path or Path(self.vector_db.uri) / f"{self.vector_db.table_name}.manifest.json"
+        return IngestionManifest(path)
+
+    def get_dedup_index(self):
+        return DedupIndex(Path(self.vector_db.uri) / f"{self.vector_db.table_name}.dedup.sqlite")
+
+    def _existing_ids(self):
+        if self.vector_db.get_count() == 0:
+            return set()
+        # Only the id column: the vectors and payloads of a large table would not fit in memory
+        return set(self.vector_db.table.to_lance().to_table(columns=["id"]).column("id").to_pylist())
+
+    def _delete_rows(self, ids):
+        ids = sorted(ids)
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ", ".join(f"'{row}'" for row in ids[start : start + DELETE_BATCH_SIZE])
+            self.vector_db.table.delete(f"id IN ({batch})")
+
+    def load(self, recreate=False, upsert=False, skip_existing=True, filters=None):
+        with get_tracer().span("ingestion.load"):
+            self._load(recreate=recreate, filters=filters)
+
+    def _load(self, recreate=False, filters=None):
+        if self.vector_db is None:
+            logger.warning("No vector db provided")
+            return
+
+        manifest = self.get_manifest()
+        dedup = self.get_dedup_index()
+        embedder = embedder_signature(self.vector_db.embedder)
+        # New embedder (or dimensions) means every stored vector is wrong. A table that
+        # predates the manifest is adopted as-is: its rows are matched by id below.
+        if recreate or manifest.embedder not in (None, embedder):
+            if self.vector_db.exists():
+                logger.info("Recreating collection")
+                self.vector_db.drop()
+            manifest.reset(embedder)
+            dedup.clear()
+        manifest.data["embedder"] = embedder
+        manifest.save()
+        if not self.vector_db.exists():
+            self.vector_db.create()
+
+        existing_ids = None
+        skipped = ingested = 0
+        pipeline = IngestionPipeline(self.vector_db, filters=filters)
+        try:
+            tracer = get_tracer()
+            for kb in self.sources:
+                name = getattr(kb, "name", None) or type(kb).__name__
+                with tracer.span("knowledge_base.load", knowledge_base=name) as span:
+                    counts = (ingested, skipped)
+                    chunking = chunking_signature(kb)
+                    for key, content_hash, read in iter_source_units(kb):
+                        if content_hash is not None and manifest.is_current(key, content_hash, chunking):
+                            skipped += 1
+                            continue
+                        batches = read()
+                        if content_hash is None:
+                            batches = list(batches)
+                            content_hash = content_sha256(document for batch in batches for document in batch)
+                            if manifest.is_current(key, content_hash, chunking):
+                                skipped += 1
+                                continue
+
+                        if existing_ids is None:
+                            existing_ids = self._existing_ids()
+                        # Only chunks whose text is not already stored, exactly or as a near-duplicate
+                        # from another source, get embedded; the source is recorded against the
+                        # canonical chunk instead. Batches stream through the pipeline while later
+                        # pages are still being parsed. The source's own previous chunks must not
+                        # match: a corrected figure would merge into the row it corrects.
+                        entry = manifest.get(key)
+                        own_ids = (set(entry["ids"]) if entry else set()) - manifest.ids_used_by_others(key)
+                        dedup.forget_source(key)
+                        dedup.forget_signatures(own_ids)
+                        new_ids = set()
+                        loaded = duplicates = 0
+                        for batch in batches:
+                            documents_to_load = []
+                            for document in batch:
+                                document_id = row_id(document)
+                                canonical_id = document_id if document_id in existing_ids else None
+                                if canonical_id is None:
+                                    signature = simhash(document.content)
+                                    chunk_figures = figures(document.content)
+                                    canonical_id = dedup.near_duplicate(signature, chunk_figures)
+                                    if canonical_id is None:
+                                        canonical_id = document_id
+                                        existing_ids.add(document_id)
+                                        dedup.add_canonical(document_id, signature, chunk_figures)
+                                        documents_to_load.append(document)
+                                    else:
+                                        duplicates += 1
+                                elif document_id in own_ids:
+                                    # Unchanged chunk kept from the old version: matchable again
+                                    signature = simhash(document.content)
+                                    dedup.add_canonical(document_id, signature, figures(document.content))
+                                new_ids.add(canonical_id)
+                                dedup.add_provenance(canonical_id, key, document)
+                            pipeline.submit(documents_to_load)
+                            loaded += len(documents_to_load)
+                        pipeline.flush()
+
+                        # Old rows go only after the new ones are written, so the source is never missing
+                        stale_ids = own_ids - new_ids
+                        if stale_ids:
+                            self._delete_rows(stale_ids & existing_ids)
+                            existing_ids -= stale_ids
+                            dedup.remove(stale_ids)
+                        logger.info(
+                            f"Ingested {key}: {loaded} new chunks, {duplicates} near-duplicates merged, "
+                            f"{len(stale_ids)} removed"
+                        )
+
+                        manifest.set(key, content_hash, chunking, new_ids)
+                        manifest.bump_version()
+                        manifest.save()
+                        dedup.commit()
+                        ingested += 1
+                    span.set(updated=ingested - counts[0], unchanged=skipped - counts[1])
+        finally:
+            pipeline.close()
+            dedup.close()
+
+        self.ingestion_version = manifest.version
+        logger.info(f"Ingestion finished: {ingested} sources updated, {skipped} unchanged")
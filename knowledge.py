@@ -0,0 +1,214 @@
+from pathlib import Path
+
+import lancedb
+from agno.knowledge.pdf import PDFKnowledgeBase
+from agno.knowledge.website import WebsiteKnowledgeBase
+from agno.utils.log import logger
+from agno.vectordb.search import SearchType
+
+from fetcher import CACHE_DIR, Fetcher, HttpCache, CachedPDFUrlKnowledgeBase, CachedWebsiteReader
+from ingestion import IncrementalCombinedKnowledgeBase, IngestionManifest
+from maintenance import PRUNE_OLDER_THAN, maintain_table, record_serving_version, version_age
+from retrieval import HybridLanceDb, LexicalReranker
+from tables import TABLES_DIR, refresh_tables
+from tracing import get_tracer
+
+LANCEDB_URI = "tmp/lancedb"
+COMBINED_TABLE = "combined_documents"
+LOCAL_PDFS = [Path("Union_Budget_FY25-26.pdf")]
+
+PDF_URLS = [
+    "https://www.indiabudget.gov.in/doc/rec/allrec.pdf",
+    "https://prsindia.org/files/budget/budget_parliament/2025/Union_Budget_Analysis_2025-26.pdf",
+    "https://www.ey.com/content/dam/ey-unified-site/ey-com/en-in/technical/alerts-hub/documents/2025/ey-union-budget-2025-alert-infra-sector.pdf",
+    "https://www.indiabudget.gov.in/doc/bh1.pdf",
+    "https://static.pib.gov.in/WriteReadData/specificdocs/documents/2025/feb/doc202524496501.pdf",
+    "https://www.indiabudget.gov.in/doc/AFS/allafs.pdf",
+    "https://www.indiabudget.gov.in/doc/eb/alldg.pdf",
+    "https://www.indiabudget.gov.in/doc/eb/allsbe.pdf",
+    "https://www.indiabudget.gov.in/doc/Finance_Bill.pdf",
+    "https://www.indiabudget.gov.in/doc/Budget_Speech.pdf",
+    "https://www.indiabudget.gov.in/doc/OutcomeBudgetE2025_2026.pdf",
+    "https://www.indiabudget.gov.in/doc/memo.pdf",
+    "https://www.indiabudget.gov.in/doc/eb/vol1.pdf",
+    "https://www.indiabudget.gov.in/doc/frbm1.pdf",
+    "https://static.pib.gov.in/WriteReadData/specificdocs/documents/2025/feb/doc202521492801.pdf",
+    "https://www.indiabudget.gov.in/budget2024-25/doc/Key_to_Budget_Document_2024.pdf",
+]
+
+WEBSITE_URLS = [
+    "https://www.india.gov.in/spotlight/union-budget-2025-2026",
+    "https://www.bajajfinserv.in/investments/income-tax-slabs",
+    "https://www.india.gov.in/spotlight/union-budget-2024-25",
+    "https://idronline.org/article/advocacy-government/budget-2025-understanding-social-sector-spending/?gad_source=1&gclid=CjwKCAiAlPu9BhAjEiwA5NDSA8hXbzwy3kj1HhhuaRlFZx4kgbgJsgDrPNIbigkD0WJQaocfzFZSwRoCnkYQAvD_BwE",
+    "https://frontline.thehindu.com/news/india-budget-2025-key-announcements-tax-relief-agriculture-healthcare-reforms/article69167699.ece",
+    "https://www.moneycontrol.com/budget/budget-2025-speech-highlights-key-announcements-of-nirmala-sitharaman-in-union-budget-of-india-article-12926372.html"
+]
+
+
+# Builds the combined knowledge base over the given sources without loading anything
+def build_knowledge_base(
+    embedder, pdf_urls=PDF_URLS, website_urls=WEBSITE_URLS, cache_dir=str(CACHE_DIR), uri=LANCEDB_URI
+):
+    vector_db = HybridLanceDb(
+        table_name="budget",
+        uri=uri,
+        search_type=SearchType.vector,
+        embedder=embedder,
+    )
+
+    combined_pdf_kb = []
+    for pdf_file in LOCAL_PDFS:
+        pdf_kb = PDFKnowledgeBase(
+            path=pdf_file,
+            vector_db=HybridLanceDb(
+                table_name=f"pdf_{pdf_file.stem}",
+                uri=uri,
+                search_type=SearchType.vector,
+                embedder=embedder,
+            ),
+            name=f"Indian Budget Local PDF - {pdf_file.stem}",
+            instructions=[
+                "Prioritize checking the pdf for answers.",
+                "Chunk the pdf in a way that preserves context.",
+                "Ensure important sections like summaries and conclusions remain intact.",
+                "Maintain the integrity of the logical sections if needed.",
+                "Each chunk should provide enough information to answer questions independently.",
+                "Create self-contained information units that can provide a full answer to a query.",
+            ]
+        )
+        combined_pdf_kb.append(pdf_kb)
+
+    pdf_knowledge_base = CachedPDFUrlKnowledgeBase(
+        urls=pdf_urls,
+        cache_dir=cache_dir,
+        vector_db=vector_db,
+        name="Indian Budget Records",
+        instructions=[
+            "For user questions first check the pdf_knowledge_base.",
+            "Divide the document into chunks that maintain context around key concepts.",
+            "Ensure important sections like summaries and conclusions remain intact.",
+            "Each chunk should provide enough information to answer questions independently."
+        ]
+    )
+
+    website_knowledge_base = WebsiteKnowledgeBase(
+        urls=website_urls,
+        reader=CachedWebsiteReader(max_links=10, cache_dir=cache_dir),
+        vector_db=HybridLanceDb(
+            table_name="website_documents",
+            uri=uri,
+            search_type=SearchType.vector,
+            embedder=embedder,
+        ),
+        max_links=10,
+        name="Indian Budget Website",
+        instructions=[
+            "Focus on extracting information that directly answers user questions about the Indian Union Budget.",
+            "Prioritize sections like headlines, key findings, summaries, announcements, and data tables.",
+            "Identify and extract specific budget-related data, such as allocations, policy changes, tax reforms, or economic forecasts.",
+            "Ignore content that is not directly related to the Indian Union Budget, such as advertisements, site navigation, or unrelated news.",
+            "Ensure each extracted piece of information retains its original context and meaning, allowing it to be understood independently.",
+            "When extracting data, include any associated explanatory text or context that explains what the data means and where it comes from.",
+            "Maintain the logical flow and coherence of extracted content, avoiding fragmented or disconnected sentences.",
+            "If a section contains multiple related data points or insights, keep them together as a single coherent unit.",
+            "Extract exact information related to the user query."
+        ]
+    )
+
+    # Only sources whose content hash changed since the last run get re-chunked and re-embedded
+    combined_knowledge_base = IncrementalCombinedKnowledgeBase(
+        sources=[pdf_knowledge_base, website_knowledge_base] + combined_pdf_kb,
+        # search_type picks the retrieval mode per knowledge base: hybrid fuses vector and
+        # full-text (BM25) results, which matters for scheme names, section numbers and figures
+        vector_db=HybridLanceDb(
+            table_name=COMBINED_TABLE,
+            uri=uri,
+            search_type=SearchType.hybrid,
+            embedder=embedder,
+            reranker=LexicalReranker(),
+        ),
+    )
+    return combined_knowledge_base
+
+
+# Read-only view of the combined table pinned to its current version, or None before the
+# first ingestion. Queries keep hitting this version while a refresh writes the next one.
+def open_snapshot(embedder, uri=LANCEDB_URI):
+    # Checked before building anything: LanceDb() creates missing tables (and embeds a probe text)
+    manifest = IngestionManifest(Path(uri) / f"{COMBINED_TABLE}.manifest.json")
+    if manifest.version == 0 or COMBINED_TABLE not in lancedb.connect(uri).table_names():
+        return None
+    knowledge_base = build_knowledge_base(embedder, pdf_urls=[], website_urls=[], uri=uri)
+    vector_db = knowledge_base.vector_db
+    knowledge_base.ingestion_version = manifest.version
+    vector_db.table.checkout(vector_db.table.version)
+    record_serving_version(vector_db.table, uri)
+    return knowledge_base
+
+
+# Seconds since the version a snapshot is pinned to was written
+def snapshot_age(knowledge_base):
+    return version_age(knowledge_base.vector_db.table)
+
+
+# Fetches every source, loads what changed and optimizes the table.
+# Returns the written knowledge base and a list of non-fatal warnings.
+def refresh_knowledge_base(
+    embedder,
+    on_progress=None,
+    prune_older_than=PRUNE_OLDER_THAN,
+    pdf_urls=PDF_URLS,
+    website_urls=WEBSITE_URLS,
+    cache_dir=CACHE_DIR,
+    uri=LANCEDB_URI,
+    tables_dir=TABLES_DIR,
+):
+    # One trace per refresh, so its fetches don't each start a trace of their own
+    with get_tracer().span("ingestion.refresh"):
+        return _refresh_knowledge_base(
+            embedder, on_progress, prune_older_than, pdf_urls, website_urls, cache_dir, uri, tables_dir
+        )
+
+
+def _refresh_knowledge_base(embedder, on_progress, prune_older_than, pdf_urls, website_urls, cache_dir, uri, tables_dir):
+    report = on_progress or (lambda percent, message: None)
+    warnings = []
+
+    report(10, "🌍 Fetching Budget Documents & Website Data...")
+    # One parallel pass over every source: cold start is bounded by the slowest download,
+    # warm restarts only revalidate against the cache
+    fetcher = Fetcher(HttpCache(cache_dir))
+    results = fetcher.fetch_many(pdf_urls + website_urls)
+    warnings += [f"Failed to fetch {result.url}: {result.error}" for result in results if not result.ok]
+    fetched_urls = {result.url for result in results if result.ok}
+
+    knowledge_base = build_knowledge_base(
+        embedder,
+        pdf_urls=[url for url in pdf_urls if url in fetched_urls],
+        website_urls=[url for url in website_urls if url in fetched_urls],
+        cache_dir=str(fetcher.cache.cache_dir),
+        uri=uri,
+    )
+
+    report(25, "📊 Extracting Budget Tables...")
+    try:
+        refresh_tables(fetcher.cache, tables_dir=tables_dir)
+    except Exception as e:
+        logger.warning(f"Budget table extraction skipped: {e}")
+        warnings.append(f"Budget table extraction skipped: {e}")
+
+    report(40, "🔍 Loading Knowledge Bases...")
+    knowledge_base.load(recreate=False)
+    if knowledge_base.vector_db.search_type == SearchType.hybrid:
+        knowledge_base.vector_db.ensure_fts_index()
+
+    report(85, "🧹 Optimizing Vector Index...")
+    try:
+        maintain_table(knowledge_base.vector_db.table, uri, prune_older_than=prune_older_than)
+    except Exception as e:
+        logger.warning(f"Vector DB maintenance skipped: {e}")
+        warnings.append(f"Vector DB maintenance skipped: {e}")
+
+    report(100, "✅ Knowledge Base Loaded Successfully!")
+    return knowledge_base, warnings
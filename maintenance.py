@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import lancedb
+from agno.utils.log import logger
+from lancedb.index import BTree, IvfPq
+
+# Build an ANN index once brute-force scans get expensive; IVF-PQ needs a few thousand rows to train well
+INDEX_MIN_ROWS = int(os.getenv("LANCEDB_INDEX_MIN_ROWS", "5000"))
+# Rebuild the IVF partitions when the table has grown this much since the last build
+INDEX_REBUILD_GROWTH = float(os.getenv("LANCEDB_INDEX_REBUILD_GROWTH", "2.0"))
+PRUNE_OLDER_THAN = timedelta(hours=float(os.getenv("LANCEDB_PRUNE_OLDER_THAN_HOURS", "1")))
+# Kept on top of the serving version's age, so a snapshot being swapped in survives too
+SNAPSHOT_MARGIN = timedelta(minutes=5)
+LATENCY_SAMPLES = 20
+
+
+def table_stats(table):
+    dataset = table.to_lance()
+    return {
+        "rows": table.count_rows(),
+        "fragments": len(dataset.get_fragments()),
+        "versions": len(dataset.versions()),
+    }
+
+
+def indexed_columns(table):
+    return {column for index in table.list_indices() for column in index.columns}
+
+
+# p50 latency (ms) of top-5 vector searches, probed with vectors already stored in the table
+def query_latency(table, samples=LATENCY_SAMPLES):
+    probes = table.search().select(["vector"]).limit(samples).to_list()
+    if not probes:
+        return None
+    timings = []
+    for probe in probes:
+        start = time.perf_counter()
+        table.search(probe["vector"]).limit(5).to_list()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def _state_path(table, uri):
+    return Path(uri) / f"{table.name}.maintenance.json"
+
+
+def _serving_path(table, uri):
+    return Path(uri) / f"{table.name}.serving.json"
+
+
+# Called when the app pins a snapshot, so pruning from another process knows what it serves
+def record_serving_version(table, uri):
+    _serving_path(table, uri).write_text(json.dumps({"version": table.version}))
+
+
+# Seconds since the given version (default: the checked-out one) was written
+def version_age(table, version=None):
+    version = table.version if version is None else version
+    for entry in table.list_versions():
+        if entry["version"] == version:
+            return time.time() - entry["timestamp"].timestamp()
+    return 0.0
+
+
+# How old a version must be before optimize() may delete it: never younger than the version
+# the app is serving (see worker.py), or the latest version when nothing records one
+def retention_for(table, uri, prune_older_than=PRUNE_OLDER_THAN):
+    serving_path = _serving_path(table, uri)
+    version = json.loads(serving_path.read_text())["version"] if serving_path.exists() else None
+    return max(prune_older_than, timedelta(seconds=version_age(table, version)) + SNAPSHOT_MARGIN)
+
+
+def _build_vector_index(table, rows):
+    dimensions = table.schema.field("vector").type.list_size
+    # ~sqrt(n) partitions and 16 dims per PQ sub-vector are the usual LanceDB starting points
+    num_partitions = max(1, int(rows**0.5))
+    num_sub_vectors = dimensions // 16 if dimensions % 16 == 0 else dimensions // 8
+    table.create_index(
+        "vector",
+        config=IvfPq(distance_type="cosine", num_partitions=num_partitions, num_sub_vectors=num_sub_vectors),
+        replace=True,
+    )
+
+
+def maintain_table(table, uri, min_rows=INDEX_MIN_ROWS, prune_older_than=PRUNE_OLDER_THAN):
+    before = table_stats(table)
+    before["p50_ms"] = query_latency(table)
+
+    # Compaction merges the small per-insert fragments, prunes old manifests and
+    # folds new rows into existing indices
+    table.optimize(cleanup_older_than=prune_older_than)
+
+    state_path = _state_path(table, uri)
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    rows = table.count_rows()
+    columns = indexed_columns(table)
+    actions = ["compacted", "pruned"]
+    if rows >= min_rows:
+        last_rows = state.get("vector_index_rows", 0)
+        if "vector" not in columns or rows >= last_rows * INDEX_REBUILD_GROWTH:
+            _build_vector_index(table, rows)
+            state["vector_index_rows"] = rows
+            actions.append("vector index built")
+        if "id" not in columns:
+            # Ingestion deletes and dedups by id
+            table.create_index("id", config=BTree(), replace=True)
+            actions.append("id index built")
+    state_path.write_text(json.dumps(state))
+
+    after = table_stats(table)
+    after["p50_ms"] = query_latency(table)
+    report = {"table": table.name, "actions": actions, "before": before, "after": after}
+    logger.info(f"LanceDB maintenance: {report}")
+    return report
+
+
+# Safe while the app is running: versions the app may still be serving are never pruned
+def maintain(uri="tmp/lancedb", table_names=None, min_rows=INDEX_MIN_ROWS):
+    db = lancedb.connect(uri)
+    reports = []
+    for name in table_names or db.table_names():
+        table = db.open_table(name)
+        reports.append(maintain_table(table, uri, min_rows, prune_older_than=retention_for(table, uri)))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and index the LanceDB knowledge tables")
+    parser.add_argument("--uri", default="tmp/lancedb")
+    parser.add_argument("--table", action="append", dest="tables", help="Table name (default: all tables)")
+    parser.add_argument("--min-rows", type=int, default=INDEX_MIN_ROWS, help="Row count before ANN indexing")
+    args = parser.parse_args()
+    for report in maintain(args.uri, args.tables, args.min_rows):
+        before, after = report["before"], report["after"]
+        print(
+            f"{report['table']}: rows {after['rows']}, "
+            f"fragments {before['fragments']} -> {after['fragments']}, "
+            f"versions {before['versions']} -> {after['versions']}, "
+            f"p50 {before['p50_ms']} ms -> {after['p50_ms']} ms ({', '.join(report['actions'])})"
+        )
+
+
+if __name__ == "__main__":
+    main()
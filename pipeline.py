@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from agno.document import Document
+from agno.utils.log import logger
+from pypdf import PdfReader
+
+from tracing import get_tracer, in_current_context
+
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+# Chunk batches buffered between parse -> embed -> write; bounds peak memory
+QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "8"))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+# Spawned (not forked) workers, since the Streamlit server process is multi-threaded
+def get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+# Runs in a worker process. Produces the same page documents and chunks as agno's PDFReader.
+def parse_page_range(path, start, end, doc_name, meta_data, chunking_strategy):
+    reader = PdfReader(path)
+    documents = []
+    for page_number in range(start, end):
+        document = Document(
+            name=doc_name,
+            id=f"{doc_name}_{page_number}",
+            meta_data={"page": page_number, **meta_data},
+            content=reader.pages[page_number - 1].extract_text(),
+        )
+        documents.extend(chunking_strategy.chunk(document) if chunking_strategy else [document])
+    return documents
+
+
+# Yields a PDF's chunks in page order, one list per page range, with at most
+# QUEUE_DEPTH ranges parsing ahead of the consumer
+def iter_pdf_batches(path, doc_name, meta_data=None, chunking_strategy=None, pages_per_task=PAGES_PER_TASK):
+    pool = get_parse_pool()
+    num_pages = len(PdfReader(path).pages)
+    in_flight = deque()
+    for start in range(1, num_pages + 1, pages_per_task):
+        end = min(start + pages_per_task, num_pages + 1)
+        in_flight.append(
+            pool.submit(parse_page_range, str(path), start, end, doc_name, meta_data or {}, chunking_strategy)
+        )
+        if len(in_flight) >= QUEUE_DEPTH:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def reader_chunking_strategy(reader):
+    return reader.chunking_strategy if getattr(reader, "chunk", False) else None
+
+
+# Embeds and writes chunk batches on two background threads, so parsing the next page
+# range overlaps with embedding and inserting the previous ones
+class IngestionPipeline:
+    def __init__(self, vector_db, filters=None, queue_depth=QUEUE_DEPTH):
+        self.vector_db = vector_db
+        self.filters = filters
+        self._embed_queue = queue.Queue(maxsize=queue_depth)
+        self._write_queue = queue.Queue(maxsize=queue_depth)
+        self._error = None
+        self._threads = [
+            threading.Thread(target=in_current_context(self._embed_loop), name="ingest-embed", daemon=True),
+            threading.Thread(target=in_current_context(self._write_loop), name="ingest-write", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _embed_loop(self):
+        embedder = self.vector_db.embedder
+        while True:
+            documents = self._embed_queue.get()
+            try:
+                if documents is None:
+                    self._write_queue.put(None)
+                    return
+                if self._error is None and hasattr(embedder, "embed_many"):
+                    embedder.embed_many([document.content for document in documents])
+                self._write_queue.put(documents)
+            except Exception as e:
+                logger.error(f"Embedding stage failed: {e}")
+                self._error = self._error or e
+            finally:
+                self._embed_queue.task_done()
+
+    def _write_loop(self):
+        while True:
+            documents = self._write_queue.get()
+            try:
+                if documents is None:
+                    return
+                if self._error is None:
+                    with get_tracer().span("vector_db.insert", rows=len(documents)):
+                        self.vector_db.insert(documents=documents, filters=self.filters)
+            except Exception as e:
+                logger.error(f"Write stage failed: {e}")
+                self._error = self._error or e
+            finally:
+                self._write_queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    # Blocks while the pipeline is QUEUE_DEPTH batches behind
+    def submit(self, documents):
+        self._raise()
+        if documents:
+            self._embed_queue.put(documents)
+
+    def flush(self):
+        self._embed_queue.join()
+        self._write_queue.join()
+        self._raise()
+
+    def close(self):
+        self._embed_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._raise()
@@ -0,0 +1,189 @@
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+from agno.document import Document
+from agno.utils.log import logger
+from agno.vectordb.lancedb import LanceDb
+from agno.vectordb.search import SearchType
+
+from dedup import DedupIndex
+from ingestion import row_id
+from tracing import get_tracer
+
+# Standard reciprocal-rank-fusion constant; larger values flatten the rank curve
+RRF_K = 60
+# Each retriever fetches limit * CANDIDATE_MULTIPLIER rows before fusion/reranking
+CANDIDATE_MULTIPLIER = 4
+
+# Keeps scheme names, demand/section numbers and figures like 1,05,000 or 12.5 intact
+TOKEN_PATTERN = re.compile(r"[\w₹]+(?:[.,/-][\w]+)*")
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+def reciprocal_rank_fusion(result_lists, k=RRF_K):
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results):
+            key = document.id or document.content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            documents.setdefault(key, document)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked]
+
+
+class LexicalReranker:
+    # BM25 over the candidate set, with extra weight on numeric and code-like tokens
+    # ("80C", "2025-26", "1,05,000") that embeddings tend to blur. The score is blended with
+    # the incoming (fused) rank rather than replacing it, so a chunk found only by vector
+    # similarity keeps its place against chunks that merely share a stray word with the query.
+    def __init__(self, k1=1.2, b=0.75, exact_boost=2.0, lexical_weight=0.3):
+        self.k1 = k1
+        self.b = b
+        self.exact_boost = exact_boost
+        self.lexical_weight = lexical_weight
+
+    def rerank(self, query, documents):
+        if not documents:
+            return documents
+        query_terms = set(tokenize(query))
+        doc_terms = [Counter(tokenize(document.content)) for document in documents]
+        avg_len = sum(sum(terms.values()) for terms in doc_terms) / len(doc_terms) or 1
+        bm25 = []
+        for terms in doc_terms:
+            length = sum(terms.values())
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term, 0)
+                if not tf:
+                    continue
+                df = sum(1 for other in doc_terms if term in other)
+                idf = math.log(1 + (len(doc_terms) - df + 0.5) / (df + 0.5))
+                weight = self.exact_boost if any(char.isdigit() for char in term) else 1.0
+                score += weight * idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            bm25.append(score)
+        # Both parts scaled to [0, 1]: rank position linearly, BM25 against the best candidate
+        best = max(bm25) or 1.0
+        for rank, (document, score) in enumerate(zip(documents, bm25)):
+            position = 1.0 - rank / len(documents)
+            document.reranking_score = (1 - self.lexical_weight) * position + self.lexical_weight * score / best
+        return sorted(documents, key=lambda document: document.reranking_score, reverse=True)
+
+
+class CrossEncoderReranker:
+    def __init__(self, model="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError(
+                "`sentence-transformers` not installed. Please install using `pip install sentence-transformers`"
+            )
+        self.model = CrossEncoder(model)
+
+    def rerank(self, query, documents):
+        if not documents:
+            return documents
+        scores = self.model.predict([(query, document.content) for document in documents])
+        for document, score in zip(documents, scores):
+            document.reranking_score = float(score)
+        return sorted(documents, key=lambda document: document.reranking_score, reverse=True)
+
+
+class HybridLanceDb(LanceDb):
+    # With search_type=SearchType.hybrid, fuses vector and full-text results with RRF and
+    # optionally reranks them; any other search_type behaves exactly like LanceDb.
+    def __init__(self, *args, reranker=None, rrf_k=RRF_K, **kwargs):
+        # Full-text search uses LanceDB's native index (see ensure_fts_index), not tantivy
+        kwargs.setdefault("use_tantivy", False)
+        super().__init__(*args, **kwargs)
+        self.reranker = reranker
+        self.rrf_k = rrf_k
+        self._fts_ready = False
+        self._dedup = None
+
+    def _to_document(self, row):
+        payload = json.loads(row["payload"])
+        return Document(
+            id=row["id"],
+            name=payload["name"],
+            meta_data=payload["meta_data"],
+            content=payload["content"],
+            embedder=self.embedder,
+            embedding=row["vector"],
+            usage=payload.get("usage"),
+        )
+
+    def ensure_fts_index(self):
+        if self._fts_ready:
+            return
+        if not any("payload" in index.columns for index in self.table.list_indices()):
+            # Native (non-tantivy) index, so table.optimize() keeps it current as rows are added
+            self.table.create_fts_index("payload", use_tantivy=False, replace=True)
+        self._fts_ready = True
+
+    def _vector_candidates(self, query, limit):
+        with get_tracer().span("vector_search.ann", limit=limit):
+            return self._search_vectors(query, limit)
+
+    def _search_vectors(self, query, limit):
+        query_embedding = self.embedder.get_embedding(query)
+        if query_embedding is None:
+            logger.error(f"Error getting embedding for Query: {query}")
+            return []
+        results = self.table.search(query_embedding, vector_column_name="vector").limit(limit)
+        if self.nprobes:
+            results = results.nprobes(self.nprobes)
+        return [self._to_document(row) for row in results.to_list()]
+
+    def _text_candidates(self, query, limit):
+        with get_tracer().span("vector_search.fts", limit=limit):
+            try:
+                self.ensure_fts_index()
+                rows = self.table.search(query, query_type="fts").limit(limit).to_list()
+            except Exception as e:
+                logger.warning(f"Full-text search failed, using vector results only: {e}")
+                return []
+            return [self._to_document(row) for row in rows]
+
+    # Adds meta_data["sources"]: every source a deduplicated chunk was ingested from
+    def _attach_provenance(self, documents):
+        if self._dedup is None:
+            path = Path(self.uri) / f"{self.table_name}.dedup.sqlite"
+            if not path.exists():
+                return documents
+            self._dedup = DedupIndex(path)
+        try:
+            sources = self._dedup.sources_for(row_id(document) for document in documents)
+        except Exception as e:
+            logger.warning(f"Could not read chunk provenance: {e}")
+            return documents
+        for document in documents:
+            document_sources = sources.get(row_id(document))
+            if document_sources:
+                document.meta_data = {**(document.meta_data or {}), "sources": document_sources}
+        return documents
+
+    def search(self, query, limit=5, filters=None):
+        with get_tracer().span("vector_search", table=self.table_name, search_type=self.search_type.value) as span:
+            documents = self._search(query, limit, filters)
+            span.set(results=len(documents))
+            return documents
+
+    def _search(self, query, limit, filters):
+        if self.search_type != SearchType.hybrid:
+            return self._attach_provenance(super().search(query, limit=limit, filters=filters))
+        candidates = limit * CANDIDATE_MULTIPLIER
+        fused = reciprocal_rank_fusion(
+            [self._vector_candidates(query, candidates), self._text_candidates(query, candidates)],
+            k=self.rrf_k,
+        )
+        if self.reranker is not None:
+            with get_tracer().span("vector_search.rerank", candidates=len(fused)):
+                fused = self.reranker.rerank(query, fused)
+        return self._attach_provenance(fused[:limit])
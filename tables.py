@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from agno.utils.log import logger
+from pypdf import PdfReader
+
+from fetcher import HttpCache
+from pipeline import PAGES_PER_TASK, get_parse_pool
+
+TABLES_DIR = Path(os.getenv("BUDGET_TABLES_DIR", "tmp/tables"))
+STORE_PATH = TABLES_DIR / "budget_tables.parquet"
+STATE_PATH = TABLES_DIR / "sources.json"
+
+# Expenditure budget and AFS documents whose demand/ministry/scheme tables are extracted
+TABLE_SOURCES = [
+    "https://www.indiabudget.gov.in/doc/eb/alldg.pdf",
+    "https://www.indiabudget.gov.in/doc/eb/allsbe.pdf",
+    "https://www.indiabudget.gov.in/doc/AFS/allafs.pdf",
+    "https://www.indiabudget.gov.in/doc/bh1.pdf",
+]
+
+SCHEMA = pa.schema(
+    [
+        ("source", pa.string()),
+        ("document", pa.string()),
+        ("page", pa.int32()),
+        ("demand_no", pa.int32()),
+        ("item", pa.string()),
+        ("period", pa.string()),
+        ("measure", pa.string()),
+        ("value", pa.float64()),
+    ]
+)
+
+NUMBER_PATTERN = re.compile(r"^\(?-?[\d,]*\d(?:\.\d+)?\)?$")
+EMPTY_CELLS = {"...", "..", "-", "--", "—"}
+PERIOD_PATTERN = re.compile(r"\b(Actuals?|Budget|Revised)\s+(?:Estimates?\s+)?(20\d\d)\s*-\s*(?:20)?(\d\d)\b", re.I)
+PERIOD_PREFIX = {"actual": "Actual", "actuals": "Actual", "budget": "BE", "revised": "RE"}
+DEMAND_PATTERN = re.compile(r"^(\d{1,3})\.?\s+")
+# Bump when extraction changes, so stored tables are re-extracted from the cached PDFs
+EXTRACTOR_VERSION = 2
+
+
+def parse_number(token):
+    # Blank cells are missing figures, not zero allocations
+    if token in EMPTY_CELLS:
+        return None
+    negative = token.startswith("(") or token.startswith("-")
+    value = float(token.strip("()-").replace(",", ""))
+    return -value if negative else value
+
+
+# Column periods in header order, e.g. ["Actual 2023-24", "BE 2024-25", "RE 2024-25", "BE 2025-26"]
+def detect_periods(text):
+    periods = []
+    for kind, year, next_year in PERIOD_PATTERN.findall(text):
+        period = f"{PERIOD_PREFIX[kind.lower()]} {year}-{next_year}"
+        if period not in periods:
+            periods.append(period)
+    return periods
+
+
+# A table row is a label followed by two or more numeric cells
+def parse_line(line, periods):
+    tokens = line.split()
+    values = []
+    while tokens and (NUMBER_PATTERN.match(tokens[-1]) or tokens[-1] in EMPTY_CELLS):
+        values.insert(0, parse_number(tokens.pop()))
+    label = " ".join(tokens).strip(" .:")
+    if len(values) < 2 or not re.search(r"[A-Za-z]{3}", label):
+        return []
+    demand_match = DEMAND_PATTERN.match(label)
+    demand_no = int(demand_match.group(1)) if demand_match else None
+    item = DEMAND_PATTERN.sub("", label)
+
+    per_period = len(values) // len(periods) if periods and len(values) % len(periods) == 0 else 0
+    if per_period in (1, 3):
+        measures = ["Total"] if per_period == 1 else ["Revenue", "Capital", "Total"]
+        columns = [(period, measure) for period in periods for measure in measures]
+    else:
+        columns = [(None, f"col{index + 1}") for index in range(len(values))]
+    return [
+        {"demand_no": demand_no, "item": item, "period": period, "measure": measure, "value": value}
+        for (period, measure), value in zip(columns, values)
+    ]
+
+
+# Runs in a parse worker process
+def extract_table_rows(path, start, end, source, document):
+    reader = PdfReader(path)
+    rows = []
+    periods = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number - 1].extract_text() or ""
+        # Continuation pages repeat no header; fall back to the nearest earlier one
+        page_periods = detect_periods(text)
+        lookback = page_number - 1
+        while not page_periods and not periods and lookback >= max(1, page_number - 3):
+            page_periods = detect_periods(reader.pages[lookback - 1].extract_text() or "")
+            lookback -= 1
+        periods = page_periods or periods
+        for line in text.splitlines():
+            for row in parse_line(line, periods):
+                rows.append({"source": source, "document": document, "page": page_number, **row})
+    return rows
+
+
+def extract_document(path, source, document):
+    pool = get_parse_pool()
+    num_pages = len(PdfReader(path).pages)
+    futures = [
+        pool.submit(extract_table_rows, str(path), start, min(start + PAGES_PER_TASK, num_pages + 1), source, document)
+        for start in range(1, num_pages + 1, PAGES_PER_TASK)
+    ]
+    return [row for future in futures for row in future.result()]
+
+
+# Re-extracts the table sources whose cached content changed; returns the number re-extracted
+def refresh_tables(cache=None, sources=TABLE_SOURCES, tables_dir=TABLES_DIR):
+    cache = cache or HttpCache()
+    tables_dir = Path(tables_dir)
+    store_path = tables_dir / STORE_PATH.name
+    state_path = tables_dir / STATE_PATH.name
+    tables_dir.mkdir(parents=True, exist_ok=True)
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    changed = {}
+    for url in sources:
+        entry = cache.entry(url)
+        if entry and state.get(url) != f"{entry['sha256']}:{EXTRACTOR_VERSION}":
+            changed[url] = entry
+    if not changed:
+        return 0
+
+    table = pq.read_table(store_path) if store_path.exists() else SCHEMA.empty_table()
+    for url in changed:
+        table = table.filter(pc.invert(pc.equal(table["source"], url)))
+    tables = [table]
+    for url, entry in changed.items():
+        document = url.split("/")[-1].split(".")[0]
+        rows = extract_document(cache.path_for(url), url, document)
+        logger.info(f"Extracted {len(rows)} table cells from {document}")
+        tables.append(pa.Table.from_pylist(rows, schema=SCHEMA))
+        state[url] = f"{entry['sha256']}:{EXTRACTOR_VERSION}"
+
+    tmp_path = store_path.with_suffix(".tmp")
+    pq.write_table(pa.concat_tables(tables), tmp_path)
+    os.replace(tmp_path, store_path)
+    state_path.write_text(json.dumps(state, indent=2))
+    return len(changed)
+
+
+class BudgetTableStore:
+    AGGREGATES = {"sum": "sum", "mean": "mean", "avg": "mean", "max": "max", "min": "min"}
+
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._table = None
+        self._mtime = None
+
+    # Re-reads the Parquet file only when a refresh has replaced it
+    def table(self):
+        with self._lock:
+            if not self.path.exists():
+                return SCHEMA.empty_table()
+            mtime = self.path.stat().st_mtime
+            if self._table is None or mtime != self._mtime:
+                self._table = pq.read_table(self.path)
+                self._mtime = mtime
+            return self._table
+
+    def query(self, item=None, period=None, measure="Total", document=None, aggregate=None, limit=20):
+        table = self.table()
+        mask = pc.is_valid(table["value"])
+        if item:
+            mask = pc.and_(mask, pc.match_substring(table["item"], item, ignore_case=True))
+        if period:
+            mask = pc.and_(mask, pc.match_substring(table["period"], period, ignore_case=True))
+        if measure:
+            mask = pc.and_(mask, pc.equal(table["measure"], measure))
+        if document:
+            mask = pc.and_(mask, pc.match_substring(table["document"], document, ignore_case=True))
+        table = table.filter(mask)
+
+        if aggregate:
+            function = self.AGGREGATES.get(aggregate.lower())
+            if function is None:
+                raise ValueError(f"Unsupported aggregate '{aggregate}', use one of {sorted(self.AGGREGATES)}")
+            grouped = table.group_by(["item", "period"]).aggregate([("value", function)])
+            grouped = pa.table(
+                {"item": grouped["item"], "period": grouped["period"], "value": grouped[f"value_{function}"]}
+            )
+            return grouped.slice(0, limit).to_pylist()
+        return table.slice(0, limit).to_pylist()
+
+
+_store = BudgetTableStore()
+
+
+def get_table_store():
+    return _store
+
+
+def query_budget_table(
+    item: str,
+    period: Optional[str] = None,
+    measure: str = "Total",
+    document: Optional[str] = None,
+    aggregate: Optional[str] = None,
+) -> str:
+    """Look up allocation figures (in ₹ crore) from the Union Budget demand, ministry and scheme tables.
+
+    Args:
+        item: Ministry, department, demand or scheme name to match, e.g. "Health" or "PM-KISAN".
+        period: Optional column period, e.g. "BE 2025-26", "RE 2024-25" or "Actual 2023-24".
+        measure: "Total" (default), "Revenue" or "Capital".
+        document: Optional source document, one of "alldg", "allsbe", "allafs", "bh1".
+        aggregate: Optional "sum", "mean", "max" or "min" over matching rows, grouped by item and period.
+
+    Returns:
+        str: JSON list of matching rows with item, period, measure, value, document and page.
+    """
+    rows = get_table_store().query(item=item, period=period, measure=measure, document=document, aggregate=aggregate)
+    return json.dumps(rows, ensure_ascii=False)
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import BACKGROUND, INTERACTIVE, CallScheduler, SchedulerBusy, set_priority
+
+MODEL = "test-model"
+
+
+class ProviderError(Exception):
+    # Shaped like google-genai's APIError: the HTTP status is on .code
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+# Fails with the given statuses in turn, then succeeds
+class FakeProvider:
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.failures:
+            raise ProviderError(self.failures.pop(0))
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(admission, "BACKOFF_BASE", 0.0)
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault("rate_limits", {MODEL: 1_000_000})
+    kwargs.setdefault("max_wait", 5)
+    return CallScheduler(**kwargs)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+# Occupies one slot at the given priority until released
+def hold_slot(scheduler, level):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run():
+        set_priority(level)
+        scheduler.call(MODEL, lambda: (started.set(), release.wait(5)))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def queue_call(scheduler, level, name, order):
+    def run():
+        set_priority(level)
+        scheduler.call(MODEL, order.append, name)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_interactive_calls_go_before_queued_background_calls():
+    scheduler = make_scheduler(max_concurrency=1, interactive_reserved=0)
+    release, holder = hold_slot(scheduler, BACKGROUND)
+    order = []
+    threads = []
+    for name in ["bg0", "bg1"]:
+        threads.append(queue_call(scheduler, BACKGROUND, name, order))
+        wait_until(lambda: scheduler.stats()["queued"] == len(threads))
+    threads.append(queue_call(scheduler, INTERACTIVE, "query", order))
+    wait_until(lambda: scheduler.stats()["queued_interactive"] == 1)
+
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert order == ["query", "bg0", "bg1"]
+
+
+def test_background_calls_never_take_reserved_slots():
+    scheduler = make_scheduler(max_concurrency=2, interactive_reserved=1)
+    release, holder = hold_slot(scheduler, BACKGROUND)
+    order = []
+    background = queue_call(scheduler, BACKGROUND, "bg", order)
+    wait_until(lambda: scheduler.stats()["queued_background"] == 1)
+
+    # The free slot is reserved: a query gets it, the background call keeps waiting
+    interactive = queue_call(scheduler, INTERACTIVE, "query", order)
+    interactive.join(5)
+    assert order == ["query"]
+    assert scheduler.stats()["queued_background"] == 1
+
+    release.set()
+    for thread in [holder, background]:
+        thread.join(5)
+    assert order == ["query", "bg"]
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_throttling_and_server_errors(status):
+    scheduler = make_scheduler()
+    provider = FakeProvider(status, status)
+    assert scheduler.call(MODEL, provider) == "ok"
+    assert provider.calls == 3
+    assert scheduler.retries == 2
+    assert scheduler.throttled == (2 if status == 429 else 0)
+
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_client_errors_are_not_retried(status):
+    scheduler = make_scheduler()
+    provider = FakeProvider(status)
+    with pytest.raises(ProviderError):
+        scheduler.call(MODEL, provider)
+    assert provider.calls == 1
+    assert scheduler.retries == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = make_scheduler(max_retries=2)
+    provider = FakeProvider(429, 429, 429, 429)
+    with pytest.raises(SchedulerBusy):
+        scheduler.call(MODEL, provider)
+    assert provider.calls == 3
+
+
+def test_stream_is_not_retried_once_it_has_yielded():
+    scheduler = make_scheduler()
+    calls = []
+
+    def stream():
+        calls.append(1)
+        yield "first"
+        raise ProviderError(503)
+
+    received = []
+    with pytest.raises(ProviderError):
+        for item in scheduler.stream(MODEL, stream):
+            received.append(item)
+    assert received == ["first"]
+    assert len(calls) == 1
+
+
+def test_interactive_call_raises_busy_after_max_wait():
+    # One request per minute: the first call takes the only token
+    scheduler = make_scheduler(rate_limits={MODEL: 1}, max_wait=0.2)
+    assert scheduler.call(MODEL, lambda: "ok") == "ok"
+    start = time.monotonic()
+    with pytest.raises(SchedulerBusy):
+        scheduler.call(MODEL, lambda: "ok")
+    assert 0.2 <= time.monotonic() - start < 2
+    assert scheduler.rejected == 1
+    assert scheduler.stats()["queued"] == 0
@@ -0,0 +1,90 @@
+import hashlib
+from dataclasses import dataclass
+
+from agno.document import Document
+from agno.embedder.base import Embedder
+from agno.knowledge.document import DocumentKnowledgeBase
+from agno.vectordb.lancedb import LanceDb
+
+from dedup import DedupIndex, figures, simhash
+from ingestion import IncrementalCombinedKnowledgeBase, row_id
+
+PASSAGE = (
+    "The total expenditure of the Union Government for the financial year is estimated at "
+    "Rs {total} crore, of which capital expenditure accounts for Rs 11,21,090 crore. The fiscal "
+    "deficit is budgeted at 4.4 per cent of GDP and net tax receipts are estimated at Rs 28,37,409 "
+    "crore. Allocation for the rural employment guarantee programme remains unchanged, and the "
+    "outlay for defence, railways and roads continues to rise in line with earlier commitments "
+    "made by the government in the interim budget presented to Parliament. The Finance Minister "
+    "said that the focus of the budget is on agriculture, micro, small and medium enterprises, "
+    "investment and exports, with a mission for self-reliance in pulses and a new scheme for "
+    "cotton productivity. States will be encouraged to undertake reforms in power distribution, "
+    "and an additional borrowing allowance will be given to them in return for measurable "
+    "improvements. The personal income tax regime has been revised so that middle class households "
+    "have more money to spend, save and invest, while customs duty rates on a number of items have "
+    "been rationalised to support domestic manufacturing and to correct inverted duty structures "
+    "across electronics, textiles and critical minerals used by new industries in the country."
+)
+
+
+# Deterministic stand-in for the Gemini embedder: a vector derived from the text hash
+@dataclass
+class HashEmbedder(Embedder):
+    dimensions: int = 8
+
+    def get_embedding(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[: self.dimensions]]
+
+    def get_embedding_and_usage(self, text):
+        return self.get_embedding(text), None
+
+
+def passage(total):
+    return PASSAGE.format(total=total)
+
+
+def stored_payloads(kb):
+    return kb.vector_db.table.to_lance().to_table(columns=["payload"]).column("payload").to_pylist()
+
+
+def load(uri, *documents):
+    kb = IncrementalCombinedKnowledgeBase(
+        sources=[DocumentKnowledgeBase(documents=list(documents))],
+        vector_db=LanceDb(table_name="combined_documents", uri=str(uri), embedder=HashEmbedder()),
+    )
+    kb.load()
+    return kb
+
+
+def test_changed_figure_is_not_a_near_duplicate(tmp_path):
+    old, new = passage("50,65,345"), passage("50,65,354")
+    assert bin(simhash(old) ^ simhash(new)).count("1") <= 3
+    index = DedupIndex(tmp_path / "dedup.sqlite")
+    index.add_canonical("old", simhash(old), figures(old))
+    assert index.near_duplicate(simhash(new), figures(new)) is None
+    assert index.near_duplicate(simhash(old), figures(old)) == "old"
+
+
+def test_reingest_with_corrected_figure_replaces_the_row(tmp_path):
+    load(tmp_path, Document(name="budget.pdf", content=passage("50,65,345")))
+    kb = load(tmp_path, Document(name="budget.pdf", content=passage("50,65,354")))
+
+    payloads = stored_payloads(kb)
+    assert len(payloads) == 1
+    assert "50,65,354" in payloads[0]
+    assert "50,65,345" not in payloads[0]
+
+
+def test_near_duplicate_from_another_source_is_merged(tmp_path):
+    text = passage("50,65,345")
+    kb = load(
+        tmp_path,
+        Document(name="budget.pdf", content=text),
+        # Same passage, extracted with slightly different punctuation
+        Document(name="budget_speech.pdf", content=text.replace("country.", "country")),
+    )
+
+    assert len(stored_payloads(kb)) == 1
+    sources = kb.get_dedup_index().sources_for([row_id(Document(content=text))])
+    assert {source["source"] for source in next(iter(sources.values()))} == {"budget.pdf", "budget_speech.pdf"}
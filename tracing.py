@@ -0,0 +1,303 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from agno.utils.log import logger
+
+# Comma-separated exporters: "json", "prometheus", "otel". Recent traces are always kept in memory.
+TRACE_EXPORTERS = os.getenv("TRACE_EXPORTERS", "")
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "tmp/traces.jsonl")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+RECENT_TRACES = 50
+# Prometheus histogram buckets (seconds), from a cache hit up to a slow multi-agent run
+BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    attributes: dict = field(default_factory=dict)
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+# Runs fn in a copy of the caller's context, so spans opened on pool or pipeline
+# threads nest under the span that scheduled them
+def in_current_context(fn):
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class RecentTraces:
+    # Finished spans of the last RECENT_TRACES traces, for the per-query breakdown
+    def __init__(self, max_traces=RECENT_TRACES):
+        self.max_traces = max_traces
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        with self._lock:
+            self._traces.setdefault(span.trace_id, []).append(span)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def spans(self, trace_id):
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+
+class JsonLogExporter:
+    # One JSON object per finished span, appended to path (or logged when path is None)
+    def __init__(self, path=TRACE_LOG_PATH):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        if self.path is None:
+            logger.info(line)
+            return
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+class PrometheusExporter:
+    # Span duration histograms, error counts and model token counters in the Prometheus text format
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._durations = {}
+        self._errors = {}
+        self._tokens = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    # collector() returns extra exposition lines, e.g. gauges owned by another component
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def export(self, span):
+        with self._lock:
+            counts = self._durations.setdefault(
+                span.name, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for index, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    counts["buckets"][index] += 1
+            counts["sum"] += span.duration
+            counts["count"] += 1
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for direction in ("input", "output"):
+                tokens = span.attributes.get(f"{direction}_tokens")
+                if tokens:
+                    key = (span.name, direction)
+                    self._tokens[key] = self._tokens.get(key, 0) + tokens
+
+    def render(self):
+        lines = [
+            "# HELP budget_span_duration_seconds Duration of traced ingestion and query stages",
+            "# TYPE budget_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, counts in sorted(self._durations.items()):
+                for bound, count in zip(self.buckets, counts["buckets"]):
+                    lines.append(f'budget_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'budget_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {counts["count"]}')
+                lines.append(f'budget_span_duration_seconds_sum{{span="{name}"}} {counts["sum"]:.6f}')
+                lines.append(f'budget_span_duration_seconds_count{{span="{name}"}} {counts["count"]}')
+            lines += [
+                "# HELP budget_span_errors_total Traced stages that raised",
+                "# TYPE budget_span_errors_total counter",
+            ]
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'budget_span_errors_total{{span="{name}"}} {count}')
+            lines += [
+                "# HELP budget_model_tokens_total Gemini tokens by stage",
+                "# TYPE budget_model_tokens_total counter",
+            ]
+            for (name, direction), count in sorted(self._tokens.items()):
+                lines.append(f'budget_model_tokens_total{{span="{name}",direction="{direction}"}} {count}')
+        for collector in self._collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+    # Serves render() at http://<host>:<port>/metrics on a daemon thread
+    def serve(self, port=METRICS_PORT, host="0.0.0.0"):
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on :{port}/metrics")
+
+
+class OpenTelemetryExporter:
+    # Mirrors spans into OpenTelemetry; configure the SDK/exporter (e.g. OTLP) through the usual OTEL_* setup
+    def __init__(self, service_name="budget-analysis-agent"):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError("`opentelemetry-api` not installed. Please install using `pip install opentelemetry-sdk`")
+        self._trace = trace
+        self._tracer = trace.get_tracer(service_name)
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span):
+        with self._lock:
+            parent = self._open.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=int(span.start * 1e9))
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def export(self, span):
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=int((span.start + span.duration) * 1e9))
+
+
+class Tracer:
+    def __init__(self, exporters=None):
+        self.recent = RecentTraces()
+        self.exporters = [self.recent] + list(exporters or [])
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def current(self):
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid4().hex,
+            span_id=uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attributes=attributes,
+        )
+        for exporter in self.exporters:
+            if hasattr(exporter, "on_start"):
+                self._call(exporter.on_start, span)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Closed from another context, e.g. an abandoned streaming generator
+                _current_span.set(parent)
+            for exporter in self.exporters:
+                self._call(exporter.export, span)
+
+    def _call(self, method, span):
+        try:
+            method(span)
+        except Exception as e:
+            logger.warning(f"Trace exporter {type(method.__self__).__name__} failed: {e}")
+
+
+# Per-stage totals of one trace in first-start order: stage, calls, seconds, tokens
+def trace_breakdown(spans):
+    stages = OrderedDict()
+    for span in sorted(spans, key=lambda span: span.start):
+        stage = stages.setdefault(span.name, {"stage": span.name, "calls": 0, "seconds": 0.0, "tokens": 0})
+        stage["calls"] += 1
+        stage["seconds"] += span.duration or 0.0
+        stage["tokens"] += span.attributes.get("input_tokens", 0) + span.attributes.get("output_tokens", 0)
+    for stage in stages.values():
+        stage["seconds"] = round(stage["seconds"], 3)
+    return list(stages.values())
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            for name in filter(None, (name.strip().lower() for name in TRACE_EXPORTERS.split(","))):
+                try:
+                    if name == "json":
+                        _tracer.add_exporter(JsonLogExporter())
+                    elif name == "prometheus":
+                        exporter = PrometheusExporter()
+                        exporter.serve()
+                        _tracer.add_exporter(exporter)
+                    elif name == "otel":
+                        _tracer.add_exporter(OpenTelemetryExporter())
+                    else:
+                        logger.warning(f"Unknown trace exporter '{name}'")
+                except (ImportError, OSError) as e:
+                    logger.warning(f"Trace exporter '{name}' disabled: {e}")
+        return _tracer
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from agno.document import Document
+from agno.tools.duckduckgo import DuckDuckGoTools
+from agno.utils.log import logger
+from agno.vectordb.search import SearchType
+from bs4 import BeautifulSoup
+
+from admission import BACKGROUND, set_priority
+from answer_cache import normalize_query
+from fetcher import CACHE_DIR, CachedWebsiteReader, Fetcher, HttpCache
+from ingestion import DELETE_BATCH_SIZE, row_id
+from maintenance import maintain_table, retention_for
+from retrieval import HybridLanceDb
+from tracing import get_tracer, in_current_context
+
+WEB_CACHE_TABLE = "web_cache"
+# Search results and the pages they point to are reused for this long
+TTL_SECONDS = int(os.getenv("WEB_CACHE_TTL", str(3 * 86400)))
+# Chunks kept in the web_cache table; the oldest go first
+MAX_CHUNKS = int(os.getenv("WEB_CACHE_MAX_CHUNKS", "5000"))
+# Result pages fetched, chunked and embedded per live search
+PAGES_PER_SEARCH = int(os.getenv("WEB_CACHE_PAGES_PER_SEARCH", "3"))
+# Downloaded result pages are kept apart from the knowledge sources, so evicting them can never
+# touch a budget PDF, and capped at this many bytes, oldest first
+PAGE_CACHE_DIR = CACHE_DIR / "web"
+MAX_PAGE_BYTES = int(float(os.getenv("WEB_CACHE_MAX_PAGE_MB", "200")) * 1024 * 1024)
+
+
+# Persistent read-through cache for the searcher's DuckDuckGo calls. Raw results are kept per
+# normalized query; result pages are chunked and embedded into the web_cache LanceDB table,
+# which knowledge_agent searches alongside the knowledge base. Lives next to the other
+# tables, e.g. tmp/lancedb/web_cache + tmp/lancedb/web_cache.sqlite
+class WebCache:
+    def __init__(
+        self,
+        embedder,
+        uri="tmp/lancedb",
+        ttl=TTL_SECONDS,
+        max_chunks=MAX_CHUNKS,
+        pages_per_search=PAGES_PER_SEARCH,
+        cache_dir=PAGE_CACHE_DIR,
+        max_page_bytes=MAX_PAGE_BYTES,
+    ):
+        self.embedder = embedder
+        self.uri = uri
+        self.ttl = ttl
+        self.max_chunks = max_chunks
+        self.pages_per_search = pages_per_search
+        self.max_page_bytes = max_page_bytes
+        # Hybrid like the combined table: news pages are full of figures and scheme names
+        self.vector_db = HybridLanceDb(
+            table_name=WEB_CACHE_TABLE,
+            uri=uri,
+            search_type=SearchType.hybrid,
+            embedder=embedder,
+        )
+        # Same crawler settings as the website knowledge base, one page per result
+        self.reader = CachedWebsiteReader(max_depth=1, max_links=1, cache_dir=str(cache_dir))
+        self.fetcher = Fetcher(HttpCache(cache_dir), max_age=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path = Path(uri) / f"{WEB_CACHE_TABLE}.sqlite"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS searches (
+                key TEXT PRIMARY KEY, query TEXT NOT NULL, results TEXT NOT NULL, created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, url TEXT, created_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS chunks_created_at ON chunks (created_at);
+            """
+        )
+        self._db.commit()
+
+    # A search asking for more results must not be answered with a shorter cached list
+    def _key(self, kind, query, max_results):
+        return hashlib.sha256(f"{kind}:{max_results}:{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    # Raw results of a fresh search for the same normalized query and result count, or None
+    def lookup(self, kind, query, max_results):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT results FROM searches WHERE key = ? AND created_at >= ?",
+                (self._key(kind, query, max_results), time.time() - self.ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def read_through(self, kind, query, max_results, search):
+        with get_tracer().span("web_cache.lookup", kind=kind) as span:
+            results = self.lookup(kind, query, max_results)
+            span.set(hit=results is not None)
+        if results is not None:
+            self.hits += 1
+            logger.info(f"Web search for '{query}' served from cache")
+            return results
+        self.misses += 1
+        results = search()
+        self.store(kind, query, max_results, results)
+        return results
+
+    # Records the results and indexes their pages on a background thread, so the searcher
+    # answers as soon as DuckDuckGo does
+    def store(self, kind, query, max_results, results):
+        try:
+            items = json.loads(results)
+        except ValueError:
+            return
+        if not isinstance(items, list) or not items:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                (self._key(kind, query, max_results), query, results, time.time()),
+            )
+            self._db.commit()
+        threading.Thread(
+            target=in_current_context(self._index_results),
+            args=(query, items),
+            name="web-cache",
+            daemon=True,
+        ).start()
+
+    def _index_results(self, query, items):
+        set_priority(BACKGROUND)
+        try:
+            with get_tracer().span("web_cache.index", results=len(items)) as span:
+                documents = self._documents(query, items)
+                span.set(chunks=self.add(documents))
+            self.evict()
+        except Exception as e:
+            logger.warning(f"Could not cache web results for '{query}': {e}")
+
+    # Result snippets, plus the chunked main content of the first pages that fetch as HTML
+    def _documents(self, query, items):
+        fetched_at = time.time()
+        documents = []
+        for item in items:
+            url = item.get("href") or item.get("url")
+            snippet = "\n".join(filter(None, [item.get("title"), item.get("body")]))
+            if url and snippet:
+                documents.append(
+                    Document(
+                        name=item.get("title") or url,
+                        content=snippet,
+                        meta_data={"url": url, "query": query, "fetched_at": fetched_at, "kind": "snippet"},
+                    )
+                )
+        urls = [item.get("href") or item.get("url") for item in items]
+        for result in self.fetcher.fetch_many([url for url in urls if url][: self.pages_per_search]):
+            entry = self.fetcher.cache.entry(result.url) if result.ok else None
+            if entry is None or "html" not in (entry.get("content_type") or ""):
+                continue
+            soup = BeautifulSoup(result.path.read_bytes(), "html.parser")
+            content = self.reader._extract_main_content(soup)
+            if not content:
+                continue
+            page = Document(
+                name=result.url,
+                content=content,
+                meta_data={"url": result.url, "query": query, "fetched_at": fetched_at, "kind": "page"},
+            )
+            documents.extend(self.reader.chunk_document(page))
+        return documents
+
+    # Embeds and inserts chunks not already in the table; returns how many were added
+    def add(self, documents):
+        now = time.time()
+        with self._lock:
+            new = {}
+            for document in documents:
+                chunk_id = row_id(document)
+                known = self._db.execute("SELECT 1 FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+                if known:
+                    self._db.execute("UPDATE chunks SET created_at = ? WHERE id = ?", (now, chunk_id))
+                else:
+                    new.setdefault(chunk_id, document)
+            if new:
+                if hasattr(self.embedder, "embed_many"):
+                    self.embedder.embed_many([document.content for document in new.values()])
+                if not self.vector_db.exists():
+                    self.vector_db.create()
+                self.vector_db.insert(list(new.values()))
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                    [(chunk_id, document.meta_data.get("url"), now) for chunk_id, document in new.items()],
+                )
+            self._db.commit()
+        return len(new)
+
+    # Drops expired result pages, then the oldest beyond max_page_bytes; returns how many
+    def _evict_pages(self, cutoff):
+        cache = self.fetcher.cache
+        entries = sorted(cache.entries().items(), key=lambda item: item[1].get("fetched_at", 0), reverse=True)
+        total = 0
+        removed = 0
+        for url, entry in entries:
+            path = cache.objects_dir / entry["sha256"] if entry.get("sha256") else None
+            total += path.stat().st_size if path and path.exists() else 0
+            if entry.get("fetched_at", 0) < cutoff or total > self.max_page_bytes:
+                cache.remove(url)
+                removed += 1
+        if removed:
+            cache.save()
+        return removed
+
+    # Drops expired searches, chunks and pages, then the oldest chunks beyond max_chunks and
+    # the oldest pages beyond max_page_bytes, and compacts the table
+    def evict(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._db.execute("DELETE FROM searches WHERE created_at < ?", (cutoff,))
+            stale = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT id FROM chunks WHERE created_at < ? "
+                    "UNION SELECT id FROM chunks WHERE id NOT IN "
+                    "(SELECT id FROM chunks ORDER BY created_at DESC LIMIT ?)",
+                    (cutoff, self.max_chunks),
+                )
+            ]
+            if stale and self.vector_db.exists():
+                for start in range(0, len(stale), DELETE_BATCH_SIZE):
+                    batch = ", ".join(f"'{chunk_id}'" for chunk_id in stale[start : start + DELETE_BATCH_SIZE])
+                    self.vector_db.table.delete(f"id IN ({batch})")
+            self._db.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in stale])
+            self._db.commit()
+        pages = self._evict_pages(cutoff)
+        if stale or pages:
+            logger.info(f"Evicted {len(stale)} web cache chunks and {pages} pages")
+        if self.vector_db.exists():
+            # Every live search inserts and deletes a few rows: compact them like the knowledge tables
+            table = self.vector_db.table
+            maintain_table(table, self.uri, prune_older_than=retention_for(table, self.uri))
+        return len(stale)
+
+    # Fresh cached chunks closest to query, tagged so the answer can cite them as web sources
+    def search(self, query, num_documents=5):
+        if not self.vector_db.exists():
+            return []
+        candidates = self.vector_db.search(query, limit=num_documents)
+        # Rows may outlive the TTL until the next eviction; chunks seen again since are fresh
+        with self._lock:
+            fresh = {
+                row[0]
+                for row in self._db.execute(
+                    f"SELECT id FROM chunks WHERE created_at >= ? AND id IN ({', '.join('?' * len(candidates))})",
+                    (time.time() - self.ttl, *(row_id(document) for document in candidates)),
+                )
+            }
+        documents = []
+        for document in candidates:
+            if row_id(document) in fresh:
+                document.meta_data = {**(document.meta_data or {}), "source": WEB_CACHE_TABLE}
+                documents.append(document)
+        return documents
+
+    def stats(self):
+        with self._lock:
+            (searches,) = self._db.execute("SELECT COUNT(*) FROM searches").fetchone()
+            (chunks,) = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "searches": searches, "chunks": chunks}
+
+
+# DuckDuckGoTools whose searches are answered from the web cache while fresh; live results are
+# recorded and their pages indexed for knowledge_agent. Docstrings double as tool descriptions.
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    def __init__(self, web_cache, **kwargs):
+        self.web_cache = web_cache
+        super().__init__(**kwargs)
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The result from DuckDuckGo.
+        """
+        return self.web_cache.read_through(
+            "text", query, max_results, partial(super().duckduckgo_search, query, max_results)
+        )
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The latest news from DuckDuckGo.
+        """
+        return self.web_cache.read_through(
+            "news", query, max_results, partial(super().duckduckgo_news, query, max_results)
+        )
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+from agno.utils.log import logger
+
+from admission import BACKGROUND, set_priority
+from knowledge import open_snapshot, refresh_knowledge_base, snapshot_age
+from maintenance import PRUNE_OLDER_THAN, SNAPSHOT_MARGIN
+
+REFRESH_INTERVAL = int(os.getenv("KB_REFRESH_INTERVAL", "86400"))
+
+
+# Keeps the knowledge base fresh on a background thread. Queries are served from
+# `current`, a snapshot pinned to the last good table version; a successful refresh
+# swaps in a snapshot of the new version in a single assignment.
+class IngestionWorker:
+    def __init__(self, embedder, refresh_interval=REFRESH_INTERVAL):
+        self.embedder = embedder
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        # Opening an existing table is all a restart has to wait for
+        self.current = open_snapshot(embedder)
+        self._status = {
+            "state": "idle",
+            "progress": 0,
+            "message": "",
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "warnings": [],
+            "version": self.current.ingestion_version if self.current else None,
+            "refreshes": 0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="ingestion-worker", daemon=True)
+                self._thread.start()
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def _loop(self):
+        # Queries go first whenever ingestion embeds compete with them for provider capacity
+        set_priority(BACKGROUND)
+        while True:
+            self._refresh()
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    # Versions newer than the serving snapshot must survive pruning until the swap
+    def _retention(self):
+        if self.current is None:
+            return PRUNE_OLDER_THAN
+        return max(PRUNE_OLDER_THAN, timedelta(seconds=snapshot_age(self.current)) + SNAPSHOT_MARGIN)
+
+    def _refresh(self):
+        self._update(state="running", progress=0, message="", started_at=time.time(), error=None)
+        try:
+            _, warnings = refresh_knowledge_base(
+                self.embedder,
+                on_progress=lambda percent, message: self._update(progress=percent, message=message),
+                prune_older_than=self._retention(),
+            )
+            snapshot = open_snapshot(self.embedder)
+            with self._lock:
+                self.current = snapshot
+                self._status.update(
+                    state="succeeded",
+                    finished_at=time.time(),
+                    warnings=warnings,
+                    version=snapshot.ingestion_version,
+                    refreshes=self._status["refreshes"] + 1,
+                )
+        except Exception as e:
+            logger.exception("Knowledge base refresh failed")
+            self._update(state="failed", finished_at=time.time(), error=str(e))